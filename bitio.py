@@ -0,0 +1,208 @@
+"""Module implementing classes for reading and writing bits.
+
+It is the common core of the bit streams of all the tools; inout_bits of
+every tool imports it and adds its own extras.
+"""
+
+
+BLOCK_SIZE = 1 << 16
+LOAD_BYTES = 8
+
+
+class BitInputStream():
+    """Class handling streaming bits from the input.
+
+    Input is read in blocks of BLOCK_SIZE bytes.
+    """
+
+    def __init__(self, inp):
+        """Initialize new instance with input and empty buffer."""
+        self.input = inp
+        self.block = b''
+        self.position = 0
+        self.eof = False
+        self.bitbuffer = 0
+        self.buffersize = 0
+
+    def _fill(self):
+        """Read next block of the input.
+
+        Return False if there is nothing more to read.
+        """
+        if self.eof:
+            return False
+        self.block = self.input.read(BLOCK_SIZE)
+        self.position = 0
+        if not self.block:
+            self.eof = True
+            return False
+        return True
+
+    def read_bit(self):
+        """Stream bit from buffer.
+
+        If buffer is empty, take the next byte of the block.
+        Return -1 at the end of the input.
+        """
+        if self.buffersize == 0:
+            if self.position == len(self.block) and not self._fill():
+                return -1
+            self.bitbuffer = self.block[self.position]
+            self.position += 1
+            self.buffersize = 8
+        self.buffersize -= 1
+        return (self.bitbuffer >> self.buffersize) & 1
+
+    def _load(self, number_of_bits):
+        """Load bytes of the block to the bit buffer until it holds number_of_bits bits.
+
+        At least LOAD_BYTES bytes are taken at once, if there are so many.
+        Return False if the input ends before.
+        """
+        while self.buffersize < number_of_bits:
+            if self.position == len(self.block) and not self._fill():
+                return False
+            end = min(len(self.block),
+                      self.position + max(LOAD_BYTES, (number_of_bits - self.buffersize + 7) >> 3))
+            self.bitbuffer = ((self.bitbuffer & ((1 << self.buffersize) - 1)) << 8 * (end - self.position)) \
+                | int.from_bytes(self.block[self.position:end], 'big')
+            self.buffersize += 8 * (end - self.position)
+            self.position = end
+        return True
+
+    def read_bits(self, number_of_bits):
+        """Stream number_of_bits bits and return them as an integer.
+
+        The first bit read is the most significant one.
+        Return -1 if the input ends before all the bits are read.
+        """
+        if self.buffersize < number_of_bits and not self._load(number_of_bits):
+            return -1
+        self.buffersize -= number_of_bits
+        return (self.bitbuffer >> self.buffersize) & ((1 << number_of_bits) - 1)
+
+    def peek_bits(self, number_of_bits):
+        """Return the next number_of_bits bits as an integer without streaming them.
+
+        Return -1 if there are less bits left in the input.
+        """
+        if self.buffersize < number_of_bits and not self._load(number_of_bits):
+            return -1
+        return (self.bitbuffer >> (self.buffersize - number_of_bits)) & ((1 << number_of_bits) - 1)
+
+    def skip_bits(self, number_of_bits):
+        """Stream number_of_bits bits, which must have been peeked, without returning them."""
+        self.buffersize -= number_of_bits
+
+    def read_byte(self):
+        """Return the next byte of the byte-aligned stream, or -1 at the end of the input.
+
+        Bits left of a partly read byte are skipped.
+        """
+        self.buffersize &= ~7
+        if self.buffersize:
+            return self.read_bits(8)
+        if self.position == len(self.block) and not self._fill():
+            return -1
+        byte = self.block[self.position]
+        self.position += 1
+        return byte
+
+    def close(self):
+        """Close stream by closing input and reseting buffer."""
+        self.input.close()
+        self.block = b''
+        self.position = 0
+        self.eof = True
+        self.bitbuffer = 0
+        self.buffersize = 0
+
+
+class BitOutputStream():
+    """Class handling streaming bits to the output.
+
+    Full bytes are collected in a bytearray, which is written to the output
+    once it reaches BLOCK_SIZE bytes.
+    """
+
+    def __init__(self, out):
+        """Initialize new instance with output and empty buffer."""
+        self.output = out
+        self.buffer = bytearray()
+        self.bitbuffer = 0
+        self.buffersize = 0
+        self.totalbytes = 0
+
+    def write_bit(self, bit):
+        """Stream bit to the buffer.
+
+        The bit must be 0 or 1 (also a NumPy integer), which is not checked.
+        """
+        self.bitbuffer = (self.bitbuffer << 1) | int(bit)
+        self.buffersize += 1
+        if self.buffersize == 8:
+            self.buffer.append(self.bitbuffer)
+            self.bitbuffer = 0
+            self.buffersize = 0
+            if len(self.buffer) >= BLOCK_SIZE:
+                self.flush()
+
+    def write_bits(self, value, bits):
+        """Stream the lowest bits of value to the buffer, most significant first.
+
+        The value must be less than 2**bits, which is not checked.
+        """
+        self.bitbuffer = (self.bitbuffer << bits) | int(value)
+        self.buffersize += bits
+        if self.buffersize >= 8:
+            rest = self.buffersize & 7
+            self.buffer += (self.bitbuffer >> rest).to_bytes(self.buffersize >> 3, 'big')
+            self.bitbuffer &= (1 << rest) - 1
+            self.buffersize = rest
+            if len(self.buffer) >= BLOCK_SIZE:
+                self.flush()
+
+    def write_byte(self, byte):
+        """Stream the byte (0 - 255) to the buffer."""
+        if self.buffersize:
+            self.write_bits(byte, 8)
+            return
+        self.buffer.append(byte)
+        if len(self.buffer) >= BLOCK_SIZE:
+            self.flush()
+
+    def write_bytes(self, data):
+        """Stream bytes to the buffer.
+
+        They are copied at once if the buffer holds only full bytes.
+        """
+        if self.buffersize:
+            self.write_bits(int.from_bytes(data, 'big'), 8 * len(data))
+            return
+        self.buffer += data
+        if len(self.buffer) >= BLOCK_SIZE:
+            self.flush()
+
+    def pad(self):
+        """Pad the last byte with zeros and flush the buffer, leaving output open."""
+        if self.buffersize != 0:
+            self.write_bits(0, 8 - self.buffersize)
+        self.flush()
+
+    def flush(self):
+        """Write full bytes from the buffer to the output."""
+        self.output.write(self.buffer)
+        self.totalbytes += len(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        """Close stream by flushing buffer and closing output.
+
+        The last byte is padded with zeros.
+        """
+        self.pad()
+        self.output.close()
+
+    def get_totalbytes(self):
+        """Return total bytes written to the output."""
+        return self.totalbytes + len(self.buffer)
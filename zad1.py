@@ -1,5 +1,21 @@
 import argparse
+import collections
+import glob
+import hashlib
+import json
 import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+CHUNK_SIZE = 1 << 20
+UNSEEN = np.iinfo(np.int64).max
+MAX_ORDER = 7
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+CACHE_DIR = '.zad1_cache'
 
 
 def parse_arguments():
@@ -8,55 +24,620 @@ def parse_arguments():
 
     argparser.add_argument(
         "input_file",
-        help='Input file to count bytes from.'
+        help='Input file to count bytes from ("-" for standard input).'
     )
 
-    return argparser.parse_args()
+    argparser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of processes counting parts of the file (default 1).'
+    )
 
+    argparser.add_argument(
+        '-k', '--order',
+        type=int,
+        default=1,
+        choices=range(1, MAX_ORDER + 1),
+        help='Also estimate conditional entropy of orders 2..ORDER (default 1).'
+    )
+
+    argparser.add_argument(
+        '-m', '--memory',
+        type=int,
+        default=64,
+        help='Memory limit of all context tables in MiB (default 64).'
+    )
+
+    argparser.add_argument(
+        '-w', '--window',
+        type=int,
+        help='Report entropy of every WINDOW bytes as JSON lines.'
+    )
+
+    argparser.add_argument(
+        '--history',
+        type=int,
+        default=8,
+        help='Number of the last windows making rolling entropy (default 8).'
+    )
+
+    argparser.add_argument(
+        '-s', '--scan',
+        action='store_true',
+        help='Treat input as a directory or glob pattern and count every file.'
+    )
+
+    argparser.add_argument(
+        '--cache',
+        default=CACHE_DIR,
+        help=f'Directory of cached histograms of scanned files (default {CACHE_DIR}).'
+    )
+
+    argparser.add_argument(
+        '--hash',
+        action='store_true',
+        help='Key cached histograms by content hash instead of path, size and mtime.'
+    )
+
+    args = argparser.parse_args()
+    if args.window is not None:
+        if args.window < 1:
+            argparser.error('window must be positive')
+        if args.scan:
+            argparser.error('argument -w/--window not allowed with -s/--scan')
+        for name, option in (('order', '-k/--order'), ('memory', '-m/--memory'),
+                             ('jobs', '-j/--jobs')):
+            if getattr(args, name) != argparser.get_default(name):
+                argparser.error(f'argument {option} not allowed with -w/--window')
+    if args.history < 1:
+        argparser.error('history must be positive')
+    return args
+
+
+class ByteHistogram():
+    """Counts of bytes and of (byte, previous byte) pairs of a byte stream.
+
+    Counts are kept in numpy arrays: `symbols[byte]` and `pairs[byte, prev]`.
+    Position of the first occurrence of every byte and pair is remembered, too,
+    so the report can list them in the order they appeared in the input.
+    """
+
+    def __init__(self, prev=0, offset=0):
+        """Initialize empty histogram.
+
+        -- prev - byte preceding the counted data (0 at the start of a file)
+        -- offset - position of the first counted byte in the input
+        """
+        self.symbols = np.zeros(256, dtype=np.int64)
+        self.pairs = np.zeros((256, 256), dtype=np.int64)
+        self.first_symbol = np.full(256, UNSEEN, dtype=np.int64)
+        self.first_pair = np.full((256, 256), UNSEEN, dtype=np.int64)
+        self.total = 0
+        self.prev = prev
+        self.offset = offset
+
+    def update(self, data):
+        """Count bytes of the next block of data.
+
+        The last byte of the block is carried over as the previous byte
+        of the next block.
+        -- data - bytes-like block of the input
+        """
+        if not data:
+            return
+        block = np.frombuffer(data, dtype=np.uint8)
+        codes = block.astype(np.intp) << 8
+        codes[0] |= self.prev
+        codes[1:] |= block[:-1]
+
+        self.symbols += np.bincount(block, minlength=256)
+        self.pairs += np.bincount(codes, minlength=1 << 16).reshape(256, 256)
+        self._update_first(self.first_symbol, block)
+        self._update_first(self.first_pair.reshape(-1), codes)
+
+        self.total += block.size
+        self.offset += block.size
+        self.prev = int(block[-1])
+
+    def _update_first(self, first, values):
+        """Remember positions of values which occur for the first time."""
+        positions = np.flatnonzero(first[values] == UNSEEN)
+        if positions.size == 0:
+            return
+        new_values, idx = np.unique(values[positions], return_index=True)
+        first[new_values] = positions[idx] + self.offset
+
+    def merge(self, other):
+        """Add counts of other histogram, which follows this one, to this one."""
+        self.symbols += other.symbols
+        self.pairs += other.pairs
+        np.minimum(self.first_symbol, other.first_symbol, out=self.first_symbol)
+        np.minimum(self.first_pair, other.first_pair, out=self.first_pair)
+        self.total += other.total
+        self.prev = other.prev
+        self.offset = other.offset
+
+    def subtract(self, other):
+        """Remove counts of other histogram, which is a part of this one.
+
+        Positions of first occurrences are left as they were.
+        """
+        self.symbols -= other.symbols
+        self.pairs -= other.pairs
+        self.total -= other.total
+
+    def save(self, path):
+        """Write histogram to the .npz file.
+
+        File is written under temporary name and renamed, so concurrent
+        readers never see it incomplete.
+        """
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as file:
+            np.savez_compressed(
+                file, symbols=self.symbols, pairs=self.pairs,
+                first_symbol=self.first_symbol, first_pair=self.first_pair,
+                state=np.array([self.total, self.prev, self.offset]))
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read histogram written by save."""
+        with np.load(path) as data:
+            total, prev, offset = data['state'].tolist()
+            hist = cls(prev, offset)
+            hist.symbols = data['symbols']
+            hist.pairs = data['pairs']
+            hist.first_symbol = data['first_symbol']
+            hist.first_pair = data['first_pair']
+            hist.total = total
+        return hist
+
+    def letters(self):
+        """Return counted bytes in order of their first occurrence."""
+        letters = np.flatnonzero(self.symbols)
+        return letters[np.argsort(self.first_symbol[letters], kind='stable')]
+
+    def letter_pairs(self):
+        """Return arrays (letters, prevs) of counted pairs.
+
+        Pairs are grouped by letter in order of its first occurrence and then
+        ordered by first occurrence of the pair itself.
+        """
+        letters, prevs = np.nonzero(self.pairs)
+        order = np.lexsort((self.first_pair[letters, prevs], self.first_symbol[letters]))
+        return letters[order], prevs[order]
+
+    def entropy(self):
+        """Return entropy of the counted bytes (0 if there are none)."""
+        if self.total == 0:
+            return 0.0
+        counts = self.symbols[self.letters()]
+        terms = counts * (_log2(self.total) - _log2(counts))
+        return _ordered_sum(terms) / self.total
+
+    def conditional_entropy(self):
+        """Return entropy of the counted bytes conditioned on the previous byte.
+
+        Pairs whose previous byte was never counted itself (the initial one)
+        are skipped. It is 0 if there are no bytes.
+        """
+        if self.total == 0:
+            return 0.0
+        letters, prevs = self.letter_pairs()
+        prev_counts = self.symbols[prevs]
+        mask = prev_counts > 0
+        counts = self.pairs[letters[mask], prevs[mask]]
+        terms = counts * (_log2(prev_counts[mask]) - _log2(counts))
+        return _ordered_sum(terms) / self.total
+
+
+class ContextTable():
+    """Counts of (context, byte) keys, where context are the preceding order bytes.
+
+    Keys are packed into uint64 and counted in a fixed-size hash table, so its
+    memory does not depend on the size of the input. Every slot holds one key;
+    a key whose slot is taken by another one is a collision. Such key replaces
+    the stored one only if its count is bigger (eviction), otherwise it is
+    dropped. Without evictions and drops the estimate is exact.
+    """
+
+    def __init__(self, order, memory):
+        """Initialize empty table.
+
+        -- order - number of bytes of the context (0 - 7)
+        -- memory - memory limit of the table in bytes
+        """
+        if not 0 <= order <= MAX_ORDER:
+            raise ValueError("Order out of range")
+        bits = max((memory // 16).bit_length() - 1, 1)
+        self.order = order
+        self.shift = np.uint64(64 - bits)
+        self.keys = np.zeros(1 << bits, dtype=np.uint64)
+        self.counts = np.zeros(1 << bits, dtype=np.int64)
+        self.tail = np.zeros(order, dtype=np.uint8)
+        self.total = 0
+        self.collisions = 0
+        self.evictions = 0
+        self.drops = 0
+
+    def update(self, data):
+        """Count keys ending in the next block of data.
+
+        The input is preceded by order zero bytes, just like byte_counter
+        treats the byte before the first one as zero.
+        -- data - bytes-like block of the input
+        """
+        if not data:
+            return
+        block = np.frombuffer(data, dtype=np.uint8)
+        extended = np.concatenate((self.tail, block))
+        keys = block.astype(np.uint64)
+        for i in range(1, self.order + 1):
+            context_byte = extended[self.order - i:self.order - i + block.size]
+            keys |= context_byte.astype(np.uint64) << np.uint64(8 * i)
+        self.tail = extended[extended.size - self.order:].copy()
+        self.total += block.size
+
+        keys, counts = np.unique(keys, return_counts=True)
+        self._add(keys, counts)
+
+    def _add(self, keys, counts):
+        """Add counts of distinct keys to the table.
+
+        Keys already stored in their slots are counted first. Of the other
+        keys sharing a slot only the most frequent one competes for it, the
+        rest are dropped. Every key which is neither stored nor put into an
+        empty slot is a collision.
+        """
+        slots = ((keys * HASH_MULTIPLIER) >> self.shift).astype(np.intp)
+        same = (self.counts[slots] > 0) & (self.keys[slots] == keys)
+        self.counts[slots[same]] += counts[same]
+        slots, keys, counts = slots[~same], keys[~same], counts[~same]
+
+        # only the most frequent of the keys sharing a slot gets there
+        order = np.lexsort((-counts, slots))
+        slots, keys, counts = slots[order], keys[order], counts[order]
+        first = np.ones(slots.size, dtype=bool)
+        first[1:] = slots[1:] != slots[:-1]
+        self.drops += int(slots.size - np.count_nonzero(first))
+        collisions = slots.size
+        slots, keys, counts = slots[first], keys[first], counts[first]
+
+        stored = self.counts[slots]
+        empty = stored == 0
+        evicted = ~empty & (counts > stored)
+        self.collisions += collisions - int(np.count_nonzero(empty))
+        self.evictions += int(np.count_nonzero(evicted))
+        self.drops += int(np.count_nonzero(~empty & ~evicted))
+        replaced = empty | evicted
+        self.keys[slots[replaced]] = keys[replaced]
+        self.counts[slots[replaced]] = counts[replaced]
+
+    def exact(self):
+        """Return True if no counts were lost, so the entropy is exact."""
+        return self.evictions == 0 and self.drops == 0
+
+    def entropy(self):
+        """Return conditional entropy of a byte given its context.
+
+        Only keys kept in the table are taken into account.
+        """
+        used = self.counts > 0
+        if not used.any():
+            return 0.0
+        keys, counts = self.keys[used], self.counts[used]
+        _, inverse = np.unique(keys >> np.uint64(8), return_inverse=True)
+        context_counts = np.bincount(inverse, weights=counts)[inverse]
+        return float(np.sum(counts * (np.log2(context_counts) - np.log2(counts)))) / counts.sum()
+
+
+def _log2(values):
+    """Return base 2 logarithm of positive integers.
+
+    math.log is used instead of np.log2 (it is called once per distinct count,
+    not per byte), so the figures are the same to the last bit as before.
+    """
+    if np.ndim(values) == 0:
+        return math.log(values, 2)
+    return np.fromiter((math.log(v, 2) for v in values.tolist()), dtype=np.float64, count=len(values))
+
+
+def _ordered_sum(terms):
+    """Sum terms one after another, as the builtin sum would."""
+    if len(terms) == 0:
+        return 0.0
+    return float(np.cumsum(terms)[-1])
+
+
+def read_blocks(input_file, start, end, chunk_size=CHUNK_SIZE):
+    """Yield consecutive blocks of bytes [start, end) of the file.
 
-def byte_counter(input_file):
-    """Read bytes from file and collect data.
-    
     -- input_file - file to read bytes from
+    -- start - position of the first byte to read
+    -- end - position after the last byte to read
+    -- chunk_size - size of the block read at once
     """
-    sym_counter = {}
-    total = 0
-    conditional_counter = {}
-    current_sym = b'\x00'
     with open(input_file, 'rb') as file:
-        byte = file.read(1)
-        while byte:
-            if byte not in sym_counter.keys():
-                sym_counter[byte] = 0
-            if byte not in conditional_counter.keys():
-                conditional_counter[byte] = {}
-            if current_sym not in conditional_counter[byte].keys():
-                conditional_counter[byte][current_sym] = 0
-            sym_counter[byte] += 1
-            conditional_counter[byte][current_sym] += 1
-            total += 1
-            current_sym = byte
-            byte = file.read(1)
-
-    s = 0
-    for letter, cond_letters in conditional_counter.items():
-        print(f'{letter}: Total: {sym_counter[letter]}')
-        for l, v in cond_letters.items():
-            print(f'\t\t{l} : {v}')
-            if l in sym_counter.keys():
-                s += v*(math.log(sym_counter[l],2) - math.log(v,2))
-
-    print('Total:', total)
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = file.read(min(chunk_size, remaining))
+            if not block:
+                break
+            yield block
+            remaining -= len(block)
+
+
+def count_range(input_file, start, end, chunk_size=CHUNK_SIZE):
+    """Read bytes [start, end) of the file and return their ByteHistogram.
+
+    The byte just before start is read too, so the pair on the boundary
+    is counted the same as in a single pass over the whole file.
+    -- input_file - file to read bytes from
+    -- start - position of the first byte to count
+    -- end - position after the last byte to count
+    -- chunk_size - size of the block read at once
+    """
+    prev = 0
+    if start > 0:
+        with open(input_file, 'rb') as file:
+            file.seek(start - 1)
+            prev = file.read(1)[0]
+    hist = ByteHistogram(prev, start)
+    for block in read_blocks(input_file, start, end, chunk_size):
+        hist.update(block)
+    return hist
+
+
+def count_file(input_file, chunk_size=CHUNK_SIZE, jobs=1):
+    """Read file in large blocks and return its ByteHistogram.
+
+    With more than one job the file is split into equal byte ranges counted
+    by separate processes, whose histograms are merged afterwards.
+    -- input_file - file to read bytes from
+    -- chunk_size - size of the block read at once
+    -- jobs - number of processes
+    """
+    size = os.path.getsize(input_file)
+    if jobs < 2 or size < 2 * chunk_size:
+        return count_range(input_file, 0, size, chunk_size)
+
+    bounds = [size * i // jobs for i in range(jobs + 1)]
+    with ProcessPoolExecutor(jobs) as executor:
+        parts = executor.map(
+            count_range,
+            [input_file] * jobs, bounds[:-1], bounds[1:], [chunk_size] * jobs)
+        hist = next(parts)
+        for part in parts:
+            hist.merge(part)
+    return hist
+
+
+def context_tables(max_order, memory):
+    """Return empty ContextTables of orders 2..max_order.
+
+    -- max_order - highest order of the context
+    -- memory - memory limit shared by all the tables in bytes
+    """
+    orders = range(2, max_order + 1)
+    return [ContextTable(order, memory // len(orders)) for order in orders]
+
+
+def count_contexts(input_file, max_order, memory, chunk_size=CHUNK_SIZE):
+    """Read file in large blocks and return ContextTables of orders 2..max_order.
+
+    -- input_file - file to read bytes from
+    -- max_order - highest order of the context
+    -- memory - memory limit shared by all the tables in bytes
+    -- chunk_size - size of the block read at once
+    """
+    tables = context_tables(max_order, memory)
+    for block in read_blocks(input_file, 0, os.path.getsize(input_file), chunk_size):
+        for table in tables:
+            table.update(block)
+    return tables
+
+
+def count_stream(stream, tables=(), chunk_size=CHUNK_SIZE):
+    """Read binary stream in large blocks and return its ByteHistogram.
+
+    The stream is read once, so the context tables are updated on the way.
+    -- stream - binary stream to read bytes from
+    -- tables - ContextTables to update
+    -- chunk_size - size of the block read at once
+    """
+    hist = ByteHistogram()
+    block = stream.read(chunk_size)
+    while block:
+        hist.update(block)
+        for table in tables:
+            table.update(block)
+        block = stream.read(chunk_size)
+    return hist
+
+
+def monitor(stream, window, history):
+    """Print entropy of consecutive windows of the stream as JSON lines.
+
+    Apart from the window itself, every line reports rolling entropy of the
+    last history windows and entropy of the whole stream read so far. Rolling
+    histogram is updated by adding the new window and subtracting the expired
+    one.
+    -- stream - binary stream to read bytes from
+    -- window - size of the window in bytes
+    -- history - number of windows making the rolling histogram
+    """
+    rolling = ByteHistogram()
+    total = ByteHistogram()
+    windows = collections.deque()
+    index = 0
+    block = stream.read(window)
+    while block:
+        current = ByteHistogram(total.prev, total.offset)
+        current.update(block)
+        rolling.merge(current)
+        total.merge(current)
+        windows.append(current)
+        if len(windows) > history:
+            rolling.subtract(windows.popleft())
+
+        print(json.dumps({
+            'window': index,
+            'offset': current.offset - current.total,
+            'size': current.total,
+            'entropy': current.entropy(),
+            'conditional_entropy': current.conditional_entropy(),
+            'rolling_size': rolling.total,
+            'rolling_entropy': rolling.entropy(),
+            'rolling_conditional_entropy': rolling.conditional_entropy(),
+            'total_size': total.total,
+            'total_entropy': total.entropy(),
+            'total_conditional_entropy': total.conditional_entropy(),
+        }), flush=True)
+        index += 1
+        block = stream.read(window)
+
+
+def find_files(pattern):
+    """Return sorted paths of files in the directory tree or matching glob pattern."""
+    if os.path.isdir(pattern):
+        return sorted(os.path.join(root, name)
+                      for root, _, names in os.walk(pattern) for name in names)
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def cache_key(input_file, by_content=False):
+    """Return name under which histogram of the file is cached.
+
+    -- input_file - counted file
+    -- by_content - hash content of the file instead of its path, size and mtime
+    """
+    digest = hashlib.sha1()
+    if by_content:
+        for block in read_blocks(input_file, 0, os.path.getsize(input_file)):
+            digest.update(block)
+    else:
+        stat = os.stat(input_file)
+        digest.update(f'{os.path.abspath(input_file)}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+def count_cached(input_file, cache_dir, by_content=False):
+    """Return (ByteHistogram, whether it was cached) of the file.
+
+    Histogram is read from the cache directory if the file has not changed,
+    otherwise the file is counted and the histogram is cached.
+    -- input_file - file to read bytes from
+    -- cache_dir - directory of cached histograms
+    -- by_content - key cached histograms by content of the file
+    """
+    path = os.path.join(cache_dir, cache_key(input_file, by_content) + '.npz')
+    if os.path.exists(path):
+        return ByteHistogram.load(path), True
+    hist = count_file(input_file)
+    hist.save(path)
+    return hist, False
+
+
+def scan(pattern, cache_dir=CACHE_DIR, by_content=False, jobs=1):
+    """Count every file of the directory or glob pattern and print their entropy.
+
+    Files are counted by a pool of processes and their histograms are merged
+    to get entropy of the whole corpus.
+    -- pattern - directory or glob pattern
+    -- cache_dir - directory of cached histograms
+    -- by_content - key cached histograms by content of the files
+    -- jobs - number of processes
+    """
+    files = find_files(pattern)
+    os.makedirs(cache_dir, exist_ok=True)
+    corpus = ByteHistogram()
+    with ProcessPoolExecutor(max(jobs, 1)) as executor:
+        results = executor.map(
+            count_cached, files, [cache_dir] * len(files), [by_content] * len(files))
+        for input_file, (hist, cached) in zip(files, results):
+            print_summary(input_file + (' (cached)' if cached else ''), hist)
+            corpus.merge(hist)
+
+    print('Files:', len(files))
+    print_summary('Corpus', corpus)
+
+
+def print_summary(name, hist):
+    """Print size and entropies of the histogram in one line."""
+    if hist.total == 0:
+        print(f'{name}: Total: 0')
+        return
+    print(f'{name}: Total: {hist.total} Entropy: {hist.entropy()}'
+          f' Conditional entropy: {hist.conditional_entropy()}')
+
+
+def print_histogram(hist):
+    """Print counts of bytes and pairs in order of their first occurrence.
+
+    -- hist - ByteHistogram to print
+    """
+    letters, prevs = hist.letter_pairs()
+    current = None
+    for letter, prev in zip(letters.tolist(), prevs.tolist()):
+        if letter != current:
+            print(f'{bytes((letter,))}: Total: {hist.symbols[letter]}')
+            current = letter
+        print(f'\t\t{bytes((prev,))} : {hist.pairs[letter, prev]}')
+
+    print('Total:', hist.total)
 
     # entropy
-    print("Entropy:", sum([x*(math.log(total,2)-math.log(x,2)) for x in sym_counter.values()])/total)
-    print(f'Conditional entropy: {s/total}')
+    print("Entropy:", hist.entropy())
+    print(f'Conditional entropy: {hist.conditional_entropy()}')
+
+
+def print_contexts(tables):
+    """Print conditional entropies of higher orders.
+
+    -- tables - ContextTables to print
+    """
+    for table in tables:
+        print(f'Order-{table.order} conditional entropy: {table.entropy()}'
+              f' (collisions: {table.collisions}, evictions: {table.evictions},'
+              f' drops: {table.drops}{", exact" if table.exact() else ""})')
+
+
+def byte_counter(input_file, jobs=1, max_order=1, memory=64 << 20):
+    """Read bytes from file and collect data.
+
+    -- input_file - file to read bytes from ("-" for standard input)
+    -- jobs - number of processes counting the file
+    -- max_order - highest order of estimated conditional entropy
+    -- memory - memory limit of the context tables in bytes
+    """
+    if input_file == '-':
+        tables = context_tables(max_order, memory) if max_order > 1 else []
+        print_histogram(count_stream(sys.stdin.buffer, tables))
+        print_contexts(tables)
+        return
+
+    print_histogram(count_file(input_file, jobs=jobs))
+    if max_order > 1:
+        print_contexts(count_contexts(input_file, max_order, memory))
 
 
 def main():
     """Read file and print data about it."""
     args = parse_arguments()
-    byte_counter(args.input_file)
+    if args.scan:
+        scan(args.input_file, args.cache, args.hash, args.jobs)
+        return
+    if args.window is not None:
+        if args.input_file == '-':
+            monitor(sys.stdin.buffer, args.window, args.history)
+        else:
+            with open(args.input_file, 'rb') as file:
+                monitor(file, args.window, args.history)
+        return
+    byte_counter(args.input_file, args.jobs, args.order, args.memory << 20)
 
 
 if __name__ == "__main__":
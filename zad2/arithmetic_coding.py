@@ -130,16 +130,7 @@ class ArithmeticDecoder(ArithmeticCoder):
         offset = self.code - self.low
         value = ((offset + 1) * total - 1) // rng
 
-        start = 0
-        end = freqs.get_symbol_limit()
-        while end - start > 1:
-            middle = (start + end) >> 1
-            if freqs.get_low(middle) > value:
-                end = middle
-            else:
-                start = middle
-
-        symbol = start
+        symbol = freqs.find_symbol(value)
         self.update(freqs, symbol)
         if not (self.low <= self.code <= self.high):
             raise AssertionError("Code out of range")
@@ -0,0 +1,286 @@
+"""Benchmark of arithmetic encoding on synthetic corpora.
+
+Corpora are generated deterministically from the seed, so results of
+different versions can be compared. Results are written as JSON.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import container
+from compressor import get_table, get_encoder, encode
+from decompressor import get_decoder, decompress
+from frequency_table import FlatFrequencyTable, counts_entropy
+from inout_bits import BitInputStream, BitOutputStream
+
+
+CORPORA = ['uniform', 'zipf', 'text', 'runs']
+
+
+def parse_arguments():
+    """Handle program arguments."""
+    argparser = argparse.ArgumentParser(
+        description='Benchmark kodowania arytmetycznego na syntetycznych danych')
+
+    argparser.add_argument(
+        '-c', '--corpus',
+        choices=CORPORA,
+        action='append',
+        help='Zestaw danych do zmierzenia, można podać wiele razy (default wszystkie).'
+    )
+
+    argparser.add_argument(
+        '-n', '--size',
+        type=int,
+        default=1 << 16,
+        help='Rozmiar każdego zestawu danych w bajtach (default 65536).'
+    )
+
+    argparser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Ziarno generatora danych (default 0).'
+    )
+
+    argparser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help='Liczba powtórzeń każdego pomiaru, wynikiem jest najlepszy czas (default 3).'
+    )
+
+    argparser.add_argument(
+        '-t', '--table',
+        choices=['simple', 'fenwick'],
+        default='fenwick',
+        help='Implementacja tablicy częstości (default fenwick)'
+    )
+
+    argparser.add_argument(
+        '-o', '--order',
+        type=int,
+        choices=[0, 1, 2],
+        default=0,
+        help='Rząd modelu kontekstowego (default 0).'
+    )
+
+    argparser.add_argument(
+        '-e', '--engine',
+        choices=container.ENGINES,
+        default='arithmetic',
+        help='Koder (default arithmetic).'
+    )
+
+    argparser.add_argument(
+        '--no-memory',
+        dest='memory',
+        action='store_false',
+        help='Bez pomiaru szczytowego zużycia pamięci (tracemalloc kilkukrotnie spowalnia kodowanie).'
+    )
+
+    argparser.add_argument(
+        '--output',
+        help='Plik na wyniki w formacie JSON (default standardowe wyjście).'
+    )
+
+    args = argparser.parse_args()
+    if args.size < 1:
+        argparser.error('size must be positive')
+    if args.repeat < 1:
+        argparser.error('repeat must be positive')
+    return args
+
+
+def generate(corpus, size, seed=0):
+    """Generate deterministic synthetic data and return it as bytes.
+
+    -- corpus - one of CORPORA:
+                uniform - independent uniformly distributed bytes
+                zipf - bytes with Zipf distribution of ranks (a = 1.5)
+                text - words of a random vocabulary with Zipf distribution,
+                       separated by spaces and line breaks
+                runs - runs of random bytes with geometric lengths (mean 64)
+    """
+    rng = np.random.default_rng(seed)
+    if corpus == 'uniform':
+        data = rng.integers(0, 256, size, dtype=np.uint8)
+    elif corpus == 'zipf':
+        data = (np.minimum(rng.zipf(1.5, size), 256) - 1).astype(np.uint8)
+    elif corpus == 'text':
+        letters = np.frombuffer(b'abcdefghijklmnopqrstuvwxyz', dtype=np.uint8)
+        vocabulary = [rng.choice(letters, length).tobytes()
+                      for length in rng.integers(1, 11, 4096)]
+        words = np.minimum(rng.zipf(1.2, size // 2 + 1), len(vocabulary)) - 1
+        separators = np.where(rng.random(len(words)) < 0.1, b'\n', b' ')
+        text = bytearray()
+        for word, separator in zip(words, separators):
+            text += vocabulary[word]
+            text += separator
+            if len(text) >= size:
+                break
+        data = np.frombuffer(bytes(text[:size]), dtype=np.uint8)
+    elif corpus == 'runs':
+        lengths = rng.geometric(1 / 64, size // 64 + 1)
+        data = np.repeat(rng.integers(0, 256, len(lengths), dtype=np.uint8), lengths)[:size]
+    else:
+        raise ValueError("Unknown corpus " + corpus)
+    return data.tobytes()
+
+
+class NullBitStream():
+    """Bit output stream which discards everything written to it."""
+
+    def write_bit(self, bit):
+        """Discard the bit."""
+
+    def write_bits(self, value, bits):
+        """Discard the bits."""
+
+    def write_byte(self, byte):
+        """Discard the byte."""
+
+
+def best_time(function, repeat):
+    """Call function repeat times and return (the shortest time, the last result)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(function):
+    """Call function and return peak of memory allocated during the call in bytes."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timing(seconds, size):
+    """Return measured time with the throughput of size bytes."""
+    return {
+        'seconds': seconds,
+        'mb_per_s': size / seconds / 1e6 if seconds > 0 else None,
+    }
+
+
+def benchmark(data, repeat=3, table='fenwick', order=0, engine='arithmetic', memory=True):
+    """Benchmark compression of the data and return dictionary of results.
+
+    Compression and decompression are timed end to end. Components are
+    timed separately:
+      - model - queries and updates of the adaptive frequency table,
+      - coder - encoder with a flat table, writing to a null stream,
+      - bit_io - writing and reading all the bits of the compressed data.
+    Peak memory of compression and decompression is measured by tracemalloc,
+    unless memory is False.
+    """
+    def compress():
+        output = io.BytesIO()
+        bit_out = BitOutputStream(output)
+        encode(io.BytesIO(data), bit_out, get_table(table, order), None, None,
+               get_encoder(engine))
+        bit_out.pad()
+        return output.getvalue()
+
+    compress_time, compressed = best_time(compress, repeat)
+
+    def decompress_():
+        output = io.BytesIO()
+        decompress(BitInputStream(io.BytesIO(compressed)), output, get_table(table, order),
+                   None, None, get_decoder(engine))
+        return output.getvalue()
+
+    decompress_time, decompressed = best_time(decompress_, repeat)
+    if decompressed != data:
+        raise RuntimeError("Decompressed data differs from the input")
+
+    def model():
+        freqs = get_table(table, order)(
+            FlatFrequencyTable(257), get_encoder(engine)(NullBitStream()).maximum_total, None)
+        for sym in data:
+            freqs.get_low(sym)
+            freqs.get_high(sym)
+            freqs.increment(sym)
+
+    def coder():
+        enc = get_encoder(engine)(NullBitStream())
+        freqs = FlatFrequencyTable(257)
+        for sym in data:
+            enc.write(freqs, sym)
+        enc.write(freqs, 256)
+        enc.finish()
+
+    bits = [(byte >> shift) & 1 for byte in compressed for shift in range(7, -1, -1)]
+
+    def bit_io():
+        bit_out = BitOutputStream(io.BytesIO())
+        for bit in bits:
+            bit_out.write_bit(bit)
+        bit_out.pad()
+        bit_in = BitInputStream(io.BytesIO(compressed))
+        while bit_in.read_bit() != -1:
+            pass
+
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256).tolist()
+    results = {
+        'size': len(data),
+        'entropy': counts_entropy(counts),
+        'compressed_size': len(compressed),
+        'bits_per_symbol': len(compressed) * 8 / len(data) if data else None,
+        'compress': timing(compress_time, len(data)),
+        'decompress': timing(decompress_time, len(data)),
+        'components': {
+            'model': timing(best_time(model, repeat)[0], len(data)),
+            'coder': timing(best_time(coder, repeat)[0], len(data)),
+            'bit_io': timing(best_time(bit_io, repeat)[0], len(data)),
+        },
+    }
+    if memory:
+        results['peak_memory'] = {
+            'compress': peak_memory(compress),
+            'decompress': peak_memory(decompress_),
+        }
+    return results
+
+
+def main():
+    """Run benchmark on the selected corpora and write results as JSON."""
+    args = parse_arguments()
+    results = {
+        'python': platform.python_version(),
+        'size': args.size,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'table': args.table,
+        'order': args.order,
+        'engine': args.engine,
+        'corpora': {},
+    }
+    for corpus in args.corpus or CORPORA:
+        print('Benchmarking', corpus, file=sys.stderr)
+        data = generate(corpus, args.size, args.seed)
+        results['corpora'][corpus] = benchmark(
+            data, args.repeat, args.table, args.order, args.engine, args.memory)
+
+    with open(args.output, 'w') if args.output else contextlib.nullcontext(sys.stdout) as output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 """Compressor of arithmetic encoding."""
 import argparse
 import contextlib
+import functools
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from frequency_table import FlatFrequencyTable, SimpleFrequencyTable
+import numpy as np
+
+import container
+import streams
+from frequency_table import FlatFrequencyTable, SimpleFrequencyTable, FenwickFrequencyTable, \
+    ContextFrequencyTable, StaticFrequencyTable, BitTreeModel, counts_entropy
 from arithmetic_coding import ArithmeticEncoder
+from range_coding import RangeEncoder
 from inout_bits import BitOutputStream
 
 
+CHUNK_SIZE = 1 << 16
+
+
 def parse_arguments():
     """Handle program arguments."""
     argparser = argparse.ArgumentParser(
@@ -14,54 +28,296 @@ def parse_arguments():
 
     argparser.add_argument(
         "input_file",
-        help='Plik do skompresowania.'
+        help='Plik do skompresowania ("-" to standardowe wejście).'
     )
 
     argparser.add_argument(
         "output_file",
-        help='Nazwa skompresowanego pliku.'
+        help='Nazwa skompresowanego pliku ("-" to standardowe wyjście, '
+             'wtedy statystyki trafiają na standardowe wyjście błędów).'
+    )
+
+    argparser.add_argument(
+        '-t', '--table',
+        choices=['simple', 'fenwick', 'binary'],
+        default='fenwick',
+        help='Implementacja tablicy częstości (default fenwick). binary to model binarny: '
+             'każdy bajt jako 8 decyzji w drzewie bitów, zawsze z koderem zakresu.'
+    )
+
+    argparser.add_argument(
+        '-o', '--order',
+        type=int,
+        choices=[0, 1, 2],
+        default=0,
+        help='Rząd modelu kontekstowego, 1 i 2 to osobna tablica dla każdego kontekstu '
+             '(default 0). Zapisany w nagłówku pliku.'
+    )
+
+    argparser.add_argument(
+        '-l', '--limit',
+        type=int,
+        help='Połowienie częstości, gdy ich suma przekroczy LIMIT '
+             '(default i najwyżej maksymalna suma kodera). Zapisana w nagłówku pliku.'
+    )
+
+    argparser.add_argument(
+        '-p', '--period',
+        type=int,
+        help='Połowienie częstości co PERIOD symboli. Zapisany w nagłówku pliku.'
+    )
+
+    argparser.add_argument(
+        '-e', '--engine',
+        choices=container.ENGINES,
+        default='arithmetic',
+        help='Koder: bitowy arytmetyczny albo bajtowy koder zakresu (default arithmetic). '
+             'Zapisany w nagłówku pliku.'
+    )
+
+    argparser.add_argument(
+        '-s', '--static',
+        action='store_true',
+        help='Dwuprzebiegowe kodowanie statycznym modelem zapisanym w nagłówku '
+             '(opcje modelu adaptacyjnego są pomijane).'
+    )
+
+    argparser.add_argument(
+        '-b', '--block-size',
+        type=int,
+        help='Kompresja niezależnych bloków po BLOCK_SIZE bajtów do kontenera z indeksem '
+             '(tylko z adaptacyjną tablicą fenwick).'
+    )
+
+    argparser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Liczba procesów kompresujących bloki (default liczba procesorów).'
+    )
+
+    argparser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        help='Bez wypisywania statystyk kompresji.'
     )
 
-    return argparser.parse_args()
+    args = argparser.parse_args()
+    if args.limit is not None and args.limit < 1:
+        argparser.error('limit must be positive')
+    if args.period is not None and args.period < 1:
+        argparser.error('period must be positive')
+    if args.jobs < 1:
+        argparser.error('jobs must be positive')
+    if args.block_size is not None:
+        if args.block_size < 1:
+            argparser.error('block size must be positive')
+        if args.static:
+            argparser.error('argument -s/--static not allowed with -b/--block-size')
+        if args.table != 'fenwick':
+            argparser.error('argument -t/--table: only fenwick allowed with -b/--block-size')
+    return args
 
 
-def compress(input, bit_out):
-    """Perform compression using arithmetic decoding."""
+def get_table(arg, order=0):
+    """Get proper frequency table class according to arguments."""
+    if order > 0:
+        return functools.partial(ContextFrequencyTable, order=order)
+    if arg == 'simple':
+        return SimpleFrequencyTable
+    return FenwickFrequencyTable
+
+
+def get_encoder(arg):
+    """Get proper encoder factory, taking the output bit stream, according to an argument."""
+    if arg == 'range':
+        return RangeEncoder
+    return functools.partial(ArithmeticEncoder, 32)
+
+
+def encode(input, bit_out, table=FenwickFrequencyTable, limit=None, period=None,
+           engine=get_encoder('arithmetic')):
+    """Encode input stream to the output bit stream and return the frequency table.
+
+    -- table - class (or factory) of the adaptive frequency table
+    -- limit - total of frequencies which makes the table rescale
+               (maximum total of the encoder by default, and at most)
+    -- period - number of symbols after which the table is rescaled
+    -- engine - factory of the encoder
+    """
+    enc = engine(bit_out)
     initfreqs = FlatFrequencyTable(257)
-    freqs = SimpleFrequencyTable(initfreqs)
-    enc = ArithmeticEncoder(32, bit_out)
-    sym = input.read(1)
+    freqs = table(initfreqs, min(limit or enc.maximum_total, enc.maximum_total), period)
+    for block in iter(functools.partial(input.read, CHUNK_SIZE), b''):
+        for sym in block:
+            enc.write(freqs, sym)
+            freqs.increment(sym)
+
+    enc.write(freqs, 256)
+    enc.finish()
+    return freqs
 
-    while sym:
-        sym = sym[0]
-        enc.write(freqs, sym)
-        freqs.increment(sym)
-        sym = input.read(1)
 
+def compress(input, bit_out, table=FenwickFrequencyTable, limit=None, period=None,
+             engine=get_encoder('arithmetic')):
+    """Perform compression using arithmetic decoding.
+
+    -- table - class (or factory) of the adaptive frequency table
+    -- limit - total of frequencies which makes the table rescale
+               (maximum total of the encoder by default, and at most)
+    -- period - number of symbols after which the table is rescaled
+    -- engine - factory of the encoder
+    """
+    freqs = encode(input, bit_out, table, limit, period, engine)
+    print_result(freqs.entropy(), freqs.get_in_size(), bit_out.get_totalbytes())
+
+
+def compress_static(input, bit_out, engine=get_encoder('arithmetic')):
+    """Perform two-pass compression with a static model.
+
+    The first pass counts bytes of the input, which must be seekable.
+    Scaled counts are written to the header and the second pass encodes
+    the input with the frozen table.
+    -- engine - factory of the encoder
+    """
+    counts = np.zeros(256, dtype=np.int64)
+    for block in iter(functools.partial(input.read, CHUNK_SIZE), b''):
+        counts += np.bincount(np.frombuffer(block, dtype=np.uint8), minlength=256)
+    counts = counts.tolist()
+
+    freqs = StaticFrequencyTable.from_counts(counts)
+    freqs.write(bit_out)
+    enc = engine(bit_out)
+    input.seek(0)
+    for block in iter(functools.partial(input.read, CHUNK_SIZE), b''):
+        for sym in block:
+            enc.write(freqs, sym)
     enc.write(freqs, 256)
     enc.finish()
+    print_result(counts_entropy(counts), sum(counts), bit_out.get_totalbytes())
+
 
-    print_result(freqs, bit_out)
+def encode_binary(input, bit_out, order=0):
+    """Encode input stream with the binary model and return the model.
 
+    -- order - order of the context of the model
+    """
+    enc = RangeEncoder(bit_out)
+    model = BitTreeModel(order)
+    for block in iter(functools.partial(input.read, CHUNK_SIZE), b''):
+        for sym in block:
+            model.write(enc, sym)
+    model.write(enc, 256)
+    enc.finish()
+    return model
 
-def print_result(freqs, bit_out):
+
+def compress_binary(input, bit_out, order=0):
+    """Perform compression using the binary model and range coding.
+
+    -- order - order of the context of the model
+    """
+    model = encode_binary(input, bit_out, order)
+    print_result(model.entropy(), model.get_in_size(), bit_out.get_totalbytes())
+
+
+def compress_block(data, engine, order, limit, period):
+    """Compress one block of the container.
+
+    Return compressed bytes and counts of the symbols in the block.
+    """
+    output = io.BytesIO()
+    bit_out = BitOutputStream(output)
+    freqs = encode(io.BytesIO(data), bit_out, get_table('fenwick', order), limit, period,
+                   get_encoder(engine))
+    bit_out.pad()
+    return output.getvalue(), freqs.counts
+
+
+def compress_blocks(input, output, block_size, jobs, engine='arithmetic', order=0, limit=None,
+                    period=None):
+    """Perform compression of independent blocks to the container.
+
+    Blocks are compressed by a pool of processes.
+    -- input - input stream
+    -- output - binary output stream
+    -- block_size - size of an uncompressed block
+    -- jobs - number of processes
+    -- engine - name of the coding engine
+    """
+    container.write_header(output, engine, order, limit, period, block_size)
+    blocks = iter(functools.partial(input.read, block_size), b'')
+    entries = []
+    counts = [0] * 257
+    position = container.HEADER.size
+    with ProcessPoolExecutor(jobs) as executor:
+        results = container.imap(
+            executor, compress_block,
+            ((block, engine, order, limit, period) for block in blocks), 2 * jobs)
+        for compressed, block_counts in results:
+            output.write(compressed)
+            entries.append((len(compressed), sum(block_counts)))
+            counts = [x + y for x, y in zip(counts, block_counts)]
+            position += len(compressed)
+    out_size = position + container.write_index(output, entries, position)
+    print_result(counts_entropy(counts), sum(counts), out_size)
+
+
+def print_result(entropy, in_size, out_size):
     """Print data about compression"""
-    print('Entropy:', freqs.entropy())
-    print('Input file size:', freqs.get_in_size(), 'bytes')
-    print('Compressed file size:', bit_out.get_totalbytes(), 'bytes')
-    print('Compression ratio:', freqs.get_in_size()/bit_out.get_totalbytes())
-    print('Average code length:', bit_out.get_totalbytes()*8/freqs.get_in_size())
+    print('Entropy:', entropy)
+    print('Input file size:', in_size, 'bytes')
+    print('Compressed file size:', out_size, 'bytes')
+    print('Compression ratio:', in_size/out_size)
+    if in_size > 0:
+        print('Average code length:', out_size*8/in_size)
+
+
+def statistics_output(args):
+    """Return context redirecting printed statistics according to arguments.
+
+    Statistics go to the standard output, unless the compressed data goes
+    there, in which case they are printed to the standard error.
+    """
+    if args.quiet:
+        return contextlib.redirect_stdout(io.StringIO())
+    if args.output_file == streams.STDIO:
+        return contextlib.redirect_stdout(sys.stderr)
+    return contextlib.nullcontext()
 
 
 def main():
     """Perform compression of input file to output file."""
     args = parse_arguments()
-    with open(args.input_file, "rb") as input, \
+    if args.block_size:
+        with streams.open_input(args.input_file) as input, \
+                streams.open_output(args.output_file) as output, statistics_output(args):
+            print('Input file:', args.input_file)
+            compress_blocks(input, output, args.block_size, args.jobs, args.engine, args.order,
+                            args.limit, args.period)
+        return
+    if args.static:
+        mode = 'static'
+    elif args.table == 'binary':
+        mode = 'binary'
+    else:
+        mode = 'adaptive'
+    header = container.pack_stream_header(
+        mode, 'simple' if args.table == 'simple' else 'fenwick', args.engine, args.order,
+        args.limit, args.period)
+    with streams.open_input(args.input_file) as input, \
             contextlib.closing(
-                    BitOutputStream(open(args.output_file, "wb"))) as output:
+                    BitOutputStream(streams.open_output(args.output_file))) as output, \
+            statistics_output(args):
         print('Input file:', args.input_file)
-        compress(input, output)
-
+        output.write_bits(int.from_bytes(header, 'big'), 8 * len(header))
+        if mode == 'static':
+            compress_static(streams.make_seekable(input), output, get_encoder(args.engine))
+        elif mode == 'binary':
+            compress_binary(input, output, args.order)
+        else:
+            compress(input, output, get_table(args.table, args.order), args.limit, args.period,
+                     get_encoder(args.engine))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+"""Headers of compressed files: a single stream and a container of blocks.
+
+A single stream starts with a header of its model settings: magic, mode,
+frequency table, coding engine, context order, rescale limit and period.
+Streams of the first version of the compressor have no header.
+
+Layout of the container of independently compressed blocks:
+  - header: magic, coding engine, context order, rescale limit and period,
+    block size
+  - compressed blocks one after another
+  - index: number of blocks and (compressed size, original size) of each
+  - trailer: position of the index
+
+Every block is coded with its own model and coder, so blocks can be
+compressed and decompressed in parallel, and any block can be decoded
+without the preceding ones.
+"""
+import collections
+import struct
+
+
+MAGIC = b'ACB2'
+STREAM_MAGIC = b'ACS2'
+ENGINES = ['arithmetic', 'range']
+MODES = ['adaptive', 'static', 'binary']
+TABLES = ['simple', 'fenwick']
+HEADER = struct.Struct('<4sBBQQQ')
+STREAM_HEADER = struct.Struct('<4sBBBBQQ')
+COUNT = struct.Struct('<Q')
+ENTRY = struct.Struct('<QQ')
+TRAILER = struct.Struct('<Q')
+
+
+def write_header(output, engine, order, limit, period, block_size):
+    """Write header of the container.
+
+    -- engine - name of the coding engine (one of ENGINES)
+    -- order - order of the context model
+    -- limit - rescale limit of the frequency tables (None for coder's maximum)
+    -- period - rescale period of the frequency tables (None for no period)
+    -- block_size - size of an uncompressed block
+    """
+    output.write(HEADER.pack(
+        MAGIC, ENGINES.index(engine), order, limit or 0, period or 0, block_size))
+
+
+def read_header(input):
+    """Read header of the container.
+
+    Return (engine, order, limit, period, block_size).
+    """
+    magic, engine, order, limit, period, block_size = HEADER.unpack(input.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a container of compressed blocks")
+    return ENGINES[engine], order, limit or None, period or None, block_size
+
+
+def pack_stream_header(mode, table, engine, order, limit, period):
+    """Return header of a single compressed stream as bytes.
+
+    -- mode - model of the stream (one of MODES)
+    -- table - implementation of the adaptive frequency table (one of TABLES)
+    -- engine - name of the coding engine (one of ENGINES)
+    -- order - order of the context model
+    -- limit - rescale limit of the frequency tables (None for coder's maximum)
+    -- period - rescale period of the frequency tables (None for no period)
+    """
+    return STREAM_HEADER.pack(STREAM_MAGIC, MODES.index(mode), TABLES.index(table),
+                              ENGINES.index(engine), order, limit or 0, period or 0)
+
+
+def read_stream_header(input):
+    """Read header of a single compressed stream from a buffered input.
+
+    Return (mode, table, engine, order, limit, period). Without the magic the
+    stream is one of the first version: nothing is read and it is given the
+    only settings of that version (adaptive order 0 model, arithmetic coder).
+    """
+    if input.peek(STREAM_HEADER.size)[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+        return 'adaptive', 'fenwick', 'arithmetic', 0, None, None
+    _, mode, table, engine, order, limit, period = STREAM_HEADER.unpack(
+        input.read(STREAM_HEADER.size))
+    return MODES[mode], TABLES[table], ENGINES[engine], order, limit or None, period or None
+
+
+def write_index(output, entries, index_offset):
+    """Write index and trailer of the container.
+
+    -- entries - list of (compressed size, original size) of the blocks
+    -- index_offset - position in the output where the index starts
+    Return number of bytes written.
+    """
+    output.write(COUNT.pack(len(entries)))
+    for entry in entries:
+        output.write(ENTRY.pack(*entry))
+    output.write(TRAILER.pack(index_offset))
+    return COUNT.size + ENTRY.size * len(entries) + TRAILER.size
+
+
+def read_index(input):
+    """Read index of the container from a seekable input.
+
+    Return list of (position, compressed size, original size) of the blocks.
+    """
+    input.seek(-TRAILER.size, 2)
+    index_offset, = TRAILER.unpack(input.read(TRAILER.size))
+    input.seek(index_offset)
+    count, = COUNT.unpack(input.read(COUNT.size))
+    blocks = []
+    position = HEADER.size
+    for _ in range(count):
+        compressed_size, original_size = ENTRY.unpack(input.read(ENTRY.size))
+        blocks.append((position, compressed_size, original_size))
+        position += compressed_size
+    return blocks
+
+
+def imap(executor, function, arguments, window):
+    """Map function over arguments in the executor, yielding results in order.
+
+    At most window tasks are submitted at once, which keeps the memory bounded.
+    -- arguments - iterable of argument tuples
+    """
+    pending = collections.deque()
+    for args in arguments:
+        pending.append(executor.submit(function, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
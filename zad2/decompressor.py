@@ -1,12 +1,23 @@
 """Decompressor of arithmetic encoding."""
 import contextlib
 import argparse
+import functools
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-from frequency_table import FlatFrequencyTable, SimpleFrequencyTable
+import container
+import streams
+from frequency_table import FlatFrequencyTable, SimpleFrequencyTable, FenwickFrequencyTable, \
+    ContextFrequencyTable, StaticFrequencyTable, BitTreeModel
 from arithmetic_coding import ArithmeticDecoder
+from range_coding import RangeDecoder
 from inout_bits import BitInputStream
 
 
+CHUNK_SIZE = 1 << 16
+
+
 def parse_arguments():
     """Handle program arguments."""
     argparser = argparse.ArgumentParser(
@@ -14,38 +25,212 @@ def parse_arguments():
 
     argparser.add_argument(
         "input_file",
-        help='Plik do dekompresowania.'
+        help='Plik do dekompresowania ("-" to standardowe wejście).'
     )
 
     argparser.add_argument(
         "output_file",
-        help='Nazwa zdekompresowanego pliku.'
+        help='Nazwa zdekompresowanego pliku ("-" to standardowe wyjście).'
+    )
+
+    argparser.add_argument(
+        '-b', '--blocks',
+        action='store_true',
+        help='Plik jest kontenerem niezależnych bloków (model zapisany w nagłówku).'
+    )
+
+    argparser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Liczba procesów dekompresujących bloki (default liczba procesorów).'
+    )
+
+    argparser.add_argument(
+        '-r', '--range',
+        type=parse_range,
+        help='Dekompresja tylko bajtów START:END kontenera bloków (np. 1000:2000, 1000:, :2000).'
     )
 
-    return argparser.parse_args()
+    args = argparser.parse_args()
+    if args.jobs < 1:
+        argparser.error('jobs must be positive')
+    return args
+
+
+def parse_range(arg):
+    """Parse range START:END of bytes, where both ends are optional."""
+    start, sep, end = arg.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError("Range must be START:END")
+    try:
+        start = int(start) if start else 0
+        end = int(end) if end else None
+    except ValueError:
+        raise argparse.ArgumentTypeError("Range must be START:END")
+    if start < 0 or (end is not None and end < start):
+        raise argparse.ArgumentTypeError("Range must satisfy 0 <= START <= END")
+    return start, end
+
+
+def get_table(arg, order=0):
+    """Get proper frequency table class according to arguments."""
+    if order > 0:
+        return functools.partial(ContextFrequencyTable, order=order)
+    if arg == 'simple':
+        return SimpleFrequencyTable
+    return FenwickFrequencyTable
 
 
-def decompress(bit_input, output):
-    """Perform decompression using arithmetic decoding."""
+def get_decoder(arg):
+    """Get proper decoder factory, taking the input bit stream, according to an argument."""
+    if arg == 'range':
+        return RangeDecoder
+    return functools.partial(ArithmeticDecoder, 32)
+
+
+def decompress(bit_input, output, table=FenwickFrequencyTable, limit=None, period=None,
+               engine=get_decoder('arithmetic')):
+    """Perform decompression using arithmetic decoding.
+
+    -- table - class (or factory) of the adaptive frequency table
+    -- limit - total of frequencies which makes the table rescale
+               (maximum total of the decoder by default, and at most)
+    -- period - number of symbols after which the table is rescaled
+    -- engine - factory of the decoder
+    """
+    decoder = engine(bit_input)
     initfreqs = FlatFrequencyTable(257)
-    freq_tab = SimpleFrequencyTable(initfreqs)
-    decoder = ArithmeticDecoder(32, bit_input)
-    while True:
-        sym = decoder.read(freq_tab)
-        if sym == 256:
-            break
-        output.write(bytes((sym,)))
+    freq_tab = table(initfreqs, min(limit or decoder.maximum_total, decoder.maximum_total), period)
+    buffer = bytearray()
+    sym = decoder.read(freq_tab)
+    while sym != 256:
+        buffer.append(sym)
+        if len(buffer) >= CHUNK_SIZE:
+            output.write(buffer)
+            buffer = bytearray()
         freq_tab.increment(sym)
+        sym = decoder.read(freq_tab)
+    output.write(buffer)
+
+
+def decompress_static(bit_input, output, engine=get_decoder('arithmetic')):
+    """Perform decompression with the static model read from the header.
+
+    -- engine - factory of the decoder
+    """
+    freqs = StaticFrequencyTable.read(bit_input)
+    decoder = engine(bit_input)
+    buffer = bytearray()
+    sym = decoder.read(freqs)
+    while sym != 256:
+        buffer.append(sym)
+        if len(buffer) >= CHUNK_SIZE:
+            output.write(buffer)
+            buffer = bytearray()
+        sym = decoder.read(freqs)
+    output.write(buffer)
+
+
+def decompress_binary(bit_input, output, order=0):
+    """Perform decompression using the binary model and range coding.
+
+    -- order - order of the context of the model
+    """
+    decoder = RangeDecoder(bit_input)
+    model = BitTreeModel(order)
+    buffer = bytearray()
+    sym = model.read(decoder)
+    while sym != 256:
+        buffer.append(sym)
+        if len(buffer) >= CHUNK_SIZE:
+            output.write(buffer)
+            buffer = bytearray()
+        sym = model.read(decoder)
+    output.write(buffer)
+
+
+def decompress_block(data, engine, order, limit, period):
+    """Decompress one block of the container and return its bytes."""
+    output = io.BytesIO()
+    decompress(BitInputStream(io.BytesIO(data)), output, get_table('fenwick', order), limit, period,
+               get_decoder(engine))
+    return output.getvalue()
+
+
+def select_blocks(blocks, start=0, end=None):
+    """Select blocks overlapping bytes [start, end) of the original data.
+
+    Return list of (position, compressed size, skip, take), where skip and take
+    tell which part of the decompressed block belongs to the range.
+    -- blocks - list of (position, compressed size, original size) from the index
+    """
+    selected = []
+    offset = 0
+    for position, compressed_size, original_size in blocks:
+        block_start = max(start, offset)
+        block_end = offset + original_size if end is None else min(end, offset + original_size)
+        if block_start < block_end:
+            selected.append((position, compressed_size, block_start - offset, block_end - block_start))
+        offset += original_size
+    return selected
+
+
+def read_blocks(input, blocks):
+    """Yield compressed data of the blocks.
+
+    -- input - seekable input stream of the container
+    -- blocks - list of (position, compressed size, ...) of the blocks
+    """
+    for position, compressed_size, *_ in blocks:
+        input.seek(position)
+        yield input.read(compressed_size)
+
+
+def decompress_blocks(input, output, jobs, start=0, end=None):
+    """Perform decompression of the container of independent blocks.
+
+    Only the blocks holding bytes [start, end) of the original data are
+    decompressed, by a pool of processes, and just these bytes are written.
+    -- input - seekable input stream of the container
+    -- output - binary output stream
+    -- jobs - number of processes
+    -- start - position of the first byte to decompress
+    -- end - position after the last byte to decompress (None for the end of data)
+    """
+    engine, order, limit, period, _ = container.read_header(input)
+    blocks = select_blocks(container.read_index(input), start, end)
+    with ProcessPoolExecutor(jobs) as executor:
+        results = container.imap(
+            executor, decompress_block,
+            ((data, engine, order, limit, period) for data in read_blocks(input, blocks)), 2 * jobs)
+        for (_, _, skip, take), data in zip(blocks, results):
+            output.write(data[skip:skip + take])
 
 
 def main():
-    """Perform decompression of input file to output file."""
-    args = parse_arguments()
-    with open(args.output_file, "wb") as output, \
-            contextlib.closing(
-                    BitInputStream(open(args.input_file, "rb"))) as input:
-        decompress(input, output)
+    """Perform decompression of input file to output file.
 
+    Model of a single stream is read from its header.
+    """
+    args = parse_arguments()
+    if args.blocks or args.range:
+        start, end = args.range or (0, None)
+        with streams.open_input(args.input_file) as input, \
+                streams.open_output(args.output_file) as output:
+            decompress_blocks(streams.make_seekable(input), output, args.jobs, start, end)
+        return
+    with streams.open_output(args.output_file) as output, \
+            streams.open_input(args.input_file) as raw_input:
+        mode, table, engine, order, limit, period = container.read_stream_header(raw_input)
+        with contextlib.closing(BitInputStream(raw_input)) as input:
+            if mode == 'static':
+                decompress_static(input, output, get_decoder(engine))
+            elif mode == 'binary':
+                decompress_binary(input, output, order)
+            else:
+                decompress(input, output, get_table(table, order), limit, period,
+                           get_decoder(engine))
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,6 @@
 """Frequency table implementation."""
+import array
+import bisect
 import math
 import numpy as np
 from abc import ABC, abstractmethod
@@ -63,6 +65,24 @@ class FrequencyTable(ABC):
         """
         raise NotImplementedError()
 
+    def find_symbol(self, value):
+        """Return the symbol whose range [low, high) contains the cumulative value.
+
+        This default binary search calls get_low about log2(n) times.
+        Implementations should override it with a faster native lookup.
+        """
+        if not 0 <= value < self.get_total():
+            raise ValueError("Value out of range")
+        start = 0
+        end = self.get_symbol_limit()
+        while end - start > 1:
+            middle = (start + end) >> 1
+            if self.get_low(middle) > value:
+                end = middle
+            else:
+                start = middle
+        return start
+
 
 class FlatFrequencyTable(FrequencyTable):
     """An immutable frequency table where every symbol has the same frequency of 1."""
@@ -96,6 +116,11 @@ class FlatFrequencyTable(FrequencyTable):
         self._check_symbol(symbol)
         return symbol + 1
 
+    def find_symbol(self, value):
+        """Return the symbol containing the cumulative value, which is the value itself."""
+        self._check_symbol(value)
+        return value
+
     def _check_symbol(self, symbol):
         """Return silently if 0 <= symbol < numsymbols, otherwise raise an exception."""
         if 0 <= symbol < self.numsymbols:
@@ -115,13 +140,18 @@ class SimpleFrequencyTable(FrequencyTable):
     """A mutable table of symbol frequencies.
 
     However, the number of symbols cannot be changed after construction.
+    The table may be rescaled, which halves all the frequencies, when its total
+    exceeds a limit or every given number of increments. Encoder and decoder
+    must use the same policy.
     """
 
-    def __init__(self, freqs):
+    def __init__(self, freqs, limit=None, period=None):
         """Construct a simple frequency table in two ways.
 
         Table can be build from FrequencyTable object or simple sequence.
         Number of the elements must be at least 1.
+        -- limit - rescale the table when its total exceeds the limit
+        -- period - rescale the table every period increments
         """
         if isinstance(freqs, FrequencyTable):
             numsym = freqs.get_symbol_limit()
@@ -137,6 +167,10 @@ class SimpleFrequencyTable(FrequencyTable):
 
         self.total = sum(self.frequencies)
         self.cumulative = None
+        self.limit = limit
+        self.period = period
+        self.counts = [0] * len(self.frequencies)
+        self.in_size = 0
 
     def get_symbol_limit(self):
         """Return the number of symbols in this frequency table."""
@@ -163,6 +197,24 @@ class SimpleFrequencyTable(FrequencyTable):
         self.total += 1
         self.frequencies[symbol] += 1
         self.cumulative = None
+        self._count(symbol)
+
+    def _count(self, symbol):
+        """Count the incremented symbol as input data and apply rescale policy."""
+        self.counts[symbol] += 1
+        self.in_size += 1
+        if (self.limit is not None and self.total > self.limit) \
+                or (self.period is not None and self.in_size % self.period == 0):
+            self.rescale()
+
+    def rescale(self):
+        """Halve all the frequencies.
+
+        Nonzero frequencies are rounded up, so no symbol becomes impossible to code.
+        """
+        self.frequencies = (self.frequencies + 1) >> 1
+        self.total = sum(self.frequencies)
+        self.cumulative = None
 
     def get_total(self):
         """Return the total of all symbol frequencies."""
@@ -192,12 +244,23 @@ class SimpleFrequencyTable(FrequencyTable):
             self._init_cumulative()
         return self.cumulative[symbol + 1]
 
+    def find_symbol(self, value):
+        """Return the symbol whose range [low, high) contains the cumulative value.
+
+        The symbol is bisected in the cumulative list.
+        """
+        if not 0 <= value < self.total:
+            raise ValueError("Value out of range")
+        if self.cumulative is None:
+            self._init_cumulative()
+        return bisect.bisect_right(self.cumulative, value) - 1
+
     def _init_cumulative(self):
         """Recompute the array of cumulative symbol frequencies."""
         cumul = [0]
         sum = 0
         for freq in self.frequencies:
-            sum += freq
+            sum += int(freq)
             cumul.append(sum)
         assert sum == self.total
         self.cumulative = cumul
@@ -209,9 +272,445 @@ class SimpleFrequencyTable(FrequencyTable):
         raise ValueError("Symbol out of range")
 
     def entropy(self):
-        """Return entropy of the data in the table."""
-        return sum([(x-1)*(math.log(self.get_in_size(), 2)-math.log((x-1), 2)) for x in self.frequencies if x > 1])/self.get_in_size()
+        """Return entropy of the data counted by the table."""
+        return counts_entropy(self.counts)
+
+    def get_in_size(self):
+        """Return size of the input data, which is the number of increments."""
+        return self.in_size
+
+
+class FenwickFrequencyTable(SimpleFrequencyTable):
+    """A mutable table of symbol frequencies backed by a Fenwick tree.
+
+    Cumulative frequencies are kept in a binary indexed tree, so incrementing
+    a symbol and computing its boundaries take O(log n) time instead of
+    rebuilding the whole cumulative list.
+    """
+
+    def __init__(self, freqs, limit=None, period=None):
+        """Construct a Fenwick frequency table from FrequencyTable object or sequence.
+
+        -- limit - rescale the table when its total exceeds the limit
+        -- period - rescale the table every period increments
+        """
+        super(FenwickFrequencyTable, self).__init__(freqs, limit, period)
+        self.frequencies = [int(freq) for freq in self.frequencies]
+        self.total = int(self.total)
+        self._init_tree()
+
+    def _init_tree(self):
+        """Build the tree of partial sums in O(n) time."""
+        self.tree = _fenwick_row(self.frequencies)
+        self.top = 1 << (len(self.frequencies).bit_length() - 1)
+
+    def set(self, symbol, freq):
+        """Set the frequency of the given symbol to the given value."""
+        self._check_symbol(symbol)
+        if freq < 0:
+            raise ValueError("Negative frequency")
+        self._add(symbol, freq - self.frequencies[symbol])
+
+    def increment(self, symbol):
+        """Increments the frequency of the given symbol."""
+        self._check_symbol(symbol)
+        self._add(symbol, 1)
+        self._count(symbol)
+
+    def rescale(self):
+        """Halve all the frequencies and rebuild the tree.
+
+        Nonzero frequencies are rounded up, so no symbol becomes impossible to code.
+        """
+        self.frequencies = [(freq + 1) >> 1 for freq in self.frequencies]
+        self.total = sum(self.frequencies)
+        self._init_tree()
+
+    def _add(self, symbol, delta):
+        """Add delta to the frequency of the symbol and to the affected tree nodes."""
+        self.frequencies[symbol] += delta
+        self.total += delta
+        tree = self.tree
+        numsym = len(tree) - 1
+        i = symbol + 1
+        while i <= numsym:
+            tree[i] += delta
+            i += i & -i
+
+    def get_low(self, symbol):
+        """Return the lower boundary.
+
+        Lower boundary is a sum of the frequencies of all the symbols strictly
+        below the given symbol value. It is summed up from the tree.
+        The returned value is at least 0.
+        """
+        self._check_symbol(symbol)
+        tree = self.tree
+        result = 0
+        while symbol > 0:
+            result += tree[symbol]
+            symbol &= symbol - 1
+        return result
+
+    def get_high(self, symbol):
+        """Return the upper boundary.
+
+        Upper boundary is a sum of the frequencies of the given symbol
+        and all the symbols below. It is summed up from the tree.
+        The returned value is at least 0.
+        """
+        return self.get_low(symbol) + self.frequencies[symbol]
+
+    def find_symbol(self, value):
+        """Return the symbol whose range [low, high) contains the cumulative value.
+
+        The tree is descended from its top node, which takes O(log n) time.
+        """
+        if not 0 <= value < self.total:
+            raise ValueError("Value out of range")
+        tree = self.tree
+        numsym = len(tree) - 1
+        pos = 0
+        step = self.top
+        while step > 0:
+            nxt = pos + step
+            if nxt <= numsym and tree[nxt] <= value:
+                pos = nxt
+                value -= tree[nxt]
+            step >>= 1
+        return pos
+
+
+class StaticFrequencyTable(FrequencyTable):
+    """An immutable table of byte frequencies and the EOF symbol for two-pass coding.
+
+    Cumulative frequencies and a lookup table from every cumulative value
+    to its symbol are computed once, so all the queries are list lookups.
+    Frequencies fit in 16 bits and the table is serialized as a bitmap of
+    the present bytes followed by their frequencies.
+    """
+
+    SCALE = 1 << 16
+    MAX_FREQ = (1 << 16) - 1
+
+    def __init__(self, freqs):
+        """Construct a static table from the sequence of frequencies of 257 symbols."""
+        self.frequencies = [int(freq) for freq in freqs]
+        if len(self.frequencies) != 257:
+            raise ValueError("Static table needs 257 symbols")
+        if any(freq < 0 for freq in self.frequencies):
+            raise ValueError("Negative frequency")
+        cumul = [0]
+        for freq in self.frequencies:
+            cumul.append(cumul[-1] + freq)
+        self.cumulative = cumul
+        self.total = cumul[-1]
+        self.lookup = array.array('H')
+        for symbol, freq in enumerate(self.frequencies):
+            self.lookup.extend(array.array('H', [symbol]) * freq)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Construct a table from counts of 256 byte values.
+
+        Counts are scaled to the total of about SCALE, every present byte keeps
+        a frequency of at least 1 and EOF symbol gets frequency 1.
+        """
+        size = sum(counts)
+        freqs = [min(max(count * cls.SCALE // size, 1), cls.MAX_FREQ) if count > 0 else 0
+                 for count in counts]
+        return cls(freqs + [1])
+
+    def write(self, bit_out):
+        """Write the bitmap of present bytes and their frequencies to the bit stream."""
+        bitmap = 0
+        for freq in self.frequencies[:256]:
+            bitmap = (bitmap << 1) | (freq > 0)
+        bit_out.write_bits(bitmap, 256)
+        for freq in self.frequencies[:256]:
+            if freq > 0:
+                bit_out.write_bits(freq, 16)
+
+    @classmethod
+    def read(cls, bit_in):
+        """Read the table written by write from the bit stream."""
+        bitmap = bit_in.read_bits(256)
+        if bitmap < 0:
+            raise EOFError()
+        freqs = []
+        for i in range(255, -1, -1):
+            freqs.append(bit_in.read_bits(16) if bitmap >> i & 1 else 0)
+        return cls(freqs + [1])
+
+    def get_symbol_limit(self):
+        """Return the number of symbols in this table."""
+        return len(self.frequencies)
+
+    def get(self, symbol):
+        """Return the frequency of the given symbol."""
+        return self.frequencies[symbol]
+
+    def get_total(self):
+        """Return the total of all symbol frequencies."""
+        return self.total
+
+    def get_low(self, symbol):
+        """Return the lower boundary from the cumulative list."""
+        return self.cumulative[symbol]
+
+    def get_high(self, symbol):
+        """Return the upper boundary from the cumulative list."""
+        return self.cumulative[symbol + 1]
+
+    def find_symbol(self, value):
+        """Return the symbol containing the cumulative value from the lookup table."""
+        return self.lookup[value]
+
+    def set(self, symbol, freq):
+        """Not implemented since this table is immutable."""
+        raise NotImplementedError()
+
+    def increment(self, symbol):
+        """Not implemented since this table is immutable."""
+        raise NotImplementedError()
+
+
+class ContextFrequencyTable(FrequencyTable):
+    """An adaptive table of symbol frequencies conditioned on preceding bytes.
+
+    There is one table per context, which is formed by the last order
+    incremented symbols (bytes). All the tables are Fenwick trees stored one
+    after another in a single flat array of counts, so the memory is fixed
+    (256**order * (numsyms + 1) counts) and every operation is O(log n).
+    The methods of FrequencyTable refer to the table of the current context,
+    which moves forward on every increment. Rescale policy works the same
+    as in SimpleFrequencyTable, but separately for every context.
+    """
+
+    def __init__(self, freqs, limit=None, period=None, order=1):
+        """Construct context tables, all of them with the frequencies from freqs.
+
+        -- freqs - FrequencyTable or sequence of initial frequencies
+        -- limit - rescale the table of a context when its total exceeds the limit
+        -- period - rescale the table of a context every period increments in it
+        -- order - number of bytes forming the context
+        """
+        if isinstance(freqs, FrequencyTable):
+            freqs = [freqs.get(i) for i in range(freqs.get_symbol_limit())]
+        freqs = [int(freq) for freq in freqs]
+        if len(freqs) < 1:
+            raise ValueError("At least 1 symbol needed")
+        if any(freq < 0 for freq in freqs):
+            raise ValueError("Negative frequency")
+        if order < 1:
+            raise ValueError("Order must be positive")
+
+        self.numsymbols = len(freqs)
+        self.rowsize = self.numsymbols + 1
+        self.top = 1 << (self.numsymbols.bit_length() - 1)
+        self.order = order
+        self.mask = (1 << (8 * order)) - 1
+        numcontexts = 1 << (8 * order)
+        self.tree = array.array('I', _fenwick_row(freqs)) * numcontexts
+        self.totals = array.array('I', [sum(freqs)]) * numcontexts
+        self.limit = limit
+        self.period = period
+        if period is not None:
+            self.increments = array.array('I', [0]) * numcontexts
+        self.context = 0
+        self.base = 0
+        self.counts = [0] * self.numsymbols
+        self.in_size = 0
+
+    def get_symbol_limit(self):
+        """Return the number of symbols in the table of every context."""
+        return self.numsymbols
+
+    def get(self, symbol):
+        """Return the frequency of the given symbol in the current context."""
+        return self.get_high(symbol) - self.get_low(symbol)
+
+    def set(self, symbol, freq):
+        """Set the frequency of the given symbol in the current context."""
+        if freq < 0:
+            raise ValueError("Negative frequency")
+        self._add(symbol, freq - self.get(symbol))
+
+    def increment(self, symbol):
+        """Increment the frequency of the symbol and move to the next context."""
+        self._check_symbol(symbol)
+        self._add(symbol, 1)
+        self.counts[symbol] += 1
+        self.in_size += 1
+
+        context = self.context
+        if (self.limit is not None and self.totals[context] > self.limit) \
+                or (self.period is not None and self._count_increment(context)):
+            self.rescale()
+
+        self.context = ((context << 8) | (symbol & 0xFF)) & self.mask
+        self.base = self.context * self.rowsize
+
+    def _count_increment(self, context):
+        """Count increment in the context, return True every period increments."""
+        self.increments[context] += 1
+        return self.increments[context] % self.period == 0
+
+    def _add(self, symbol, delta):
+        """Add delta to the frequency of the symbol in the current context."""
+        self.totals[self.context] += delta
+        tree = self.tree
+        base = self.base
+        i = symbol + 1
+        while i <= self.numsymbols:
+            tree[base + i] += delta
+            i += i & -i
+
+    def rescale(self):
+        """Halve all the frequencies in the current context.
+
+        Nonzero frequencies are rounded up, so no symbol becomes impossible to code.
+        """
+        freqs = [(self.get(symbol) + 1) >> 1 for symbol in range(self.numsymbols)]
+        self.tree[self.base:self.base + self.rowsize] = array.array('I', _fenwick_row(freqs))
+        self.totals[self.context] = sum(freqs)
+
+    def get_total(self):
+        """Return the total of symbol frequencies in the current context."""
+        return self.totals[self.context]
+
+    def get_low(self, symbol):
+        """Return the lower boundary of the symbol in the current context."""
+        self._check_symbol(symbol)
+        tree = self.tree
+        base = self.base
+        result = 0
+        while symbol > 0:
+            result += tree[base + symbol]
+            symbol &= symbol - 1
+        return result
+
+    def get_high(self, symbol):
+        """Return the upper boundary of the symbol in the current context."""
+        return self.get_low(symbol + 1) if symbol + 1 < self.numsymbols \
+            else self.totals[self.context]
+
+    def find_symbol(self, value):
+        """Return the symbol containing the cumulative value in the current context.
+
+        The tree of the context is descended from its top node.
+        """
+        if not 0 <= value < self.totals[self.context]:
+            raise ValueError("Value out of range")
+        tree = self.tree
+        base = self.base
+        numsym = self.numsymbols
+        pos = 0
+        step = self.top
+        while step > 0:
+            nxt = pos + step
+            if nxt <= numsym and tree[base + nxt] <= value:
+                pos = nxt
+                value -= tree[base + nxt]
+            step >>= 1
+        return pos
+
+    def _check_symbol(self, symbol):
+        """Return silently if 0 <= symbol < numsymbols, otherwise raise an exception."""
+        if 0 <= symbol < self.numsymbols:
+            return
+        raise ValueError("Symbol out of range")
+
+    def entropy(self):
+        """Return order-0 entropy of the data counted by the table."""
+        return counts_entropy(self.counts)
+
+    def get_in_size(self):
+        """Return size of the input data, which is the number of increments."""
+        return self.in_size
+
+
+class BitTreeModel():
+    """An adaptive binary model coding every byte as 8 binary decisions.
+
+    The decisions are nodes of a bit-tree: the node of a bit is formed by
+    the leading 1 and the preceding bits of the byte, most significant
+    first. Every node has a 12-bit probability of the bit being 0, which
+    the coder updates after coding the bit. Before every byte a flag tells
+    whether the data ends there (symbol 256), and it has a probability of
+    its own at the unused node 0. As in ContextFrequencyTable there is a row
+    of 256 probabilities per context of the last order bytes, all of them
+    in a single flat array.
+    """
+
+    PROB_BITS = 12
+
+    def __init__(self, order=0):
+        """Construct model with all probabilities equal to 1/2.
+
+        -- order - number of bytes forming the context
+        """
+        if order < 0:
+            raise ValueError("Order must not be negative")
+        self.order = order
+        self.mask = (1 << (8 * order)) - 1
+        self.probs = array.array('H', [1 << (self.PROB_BITS - 1)]) * (256 << (8 * order))
+        self.context = 0
+        self.base = 0
+        self.counts = [0] * 256
+        self.in_size = 0
+
+    def write(self, enc, symbol):
+        """Encode the symbol (byte or 256 for the end of data) with the binary encoder."""
+        probs = self.probs
+        base = self.base
+        if symbol == 256:
+            enc.write_bit(probs, base, 1)
+            return
+        enc.write_bit(probs, base, 0)
+        enc.write_tree(probs, base, symbol)
+        self.increment(symbol)
+
+    def read(self, dec):
+        """Decode the next symbol (byte or 256 for the end of data) with the binary decoder."""
+        probs = self.probs
+        base = self.base
+        if dec.read_bit(probs, base):
+            return 256
+        symbol = dec.read_tree(probs, base)
+        self.increment(symbol)
+        return symbol
+
+    def increment(self, symbol):
+        """Count the byte and move to the next context."""
+        self.counts[symbol] += 1
+        self.in_size += 1
+        self.context = ((self.context << 8) | symbol) & self.mask
+        self.base = self.context << 8
+
+    def entropy(self):
+        """Return order-0 entropy of the data counted by the model."""
+        return counts_entropy(self.counts)
 
     def get_in_size(self):
-        """Return size of the input data."""
-        return self.total - len(self.frequencies)
+        """Return size of the input data, which is the number of coded bytes."""
+        return self.in_size
+
+
+def counts_entropy(counts):
+    """Return entropy of data with the given counts of symbols."""
+    size = sum(counts)
+    if size == 0:
+        return 0.0
+    return sum([x*(math.log(size, 2)-math.log(x, 2)) for x in counts if x > 0])/size
+
+
+def _fenwick_row(freqs):
+    """Return Fenwick tree (with unused 0th element) of the frequencies."""
+    numsym = len(freqs)
+    tree = [0] + list(freqs)
+    for i in range(1, numsym + 1):
+        parent = i + (i & -i)
+        if parent <= numsym:
+            tree[parent] += tree[i]
+    return tree
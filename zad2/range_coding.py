@@ -0,0 +1,218 @@
+"""Module implementing range coding.
+
+Range coder is an alternative to the bitwise arithmetic coder. It keeps
+32-bit state and renormalizes a whole byte at a time, writing the bytes
+straight to the output buffer (carry is propagated through a cached byte).
+Besides symbols of frequency tables it codes binary decisions with adaptive
+PROB_BITS-bit probabilities, which need no cumulative frequencies at all.
+"""
+
+
+class RangeCoder():
+    """Base class for range coding."""
+
+    TOP = 1 << 24
+    STATE_MASK = (1 << 32) - 1
+    PROB_BITS = 12
+    PROB_ONE = 1 << PROB_BITS
+    MOVE_BITS = 5
+
+    def __init__(self):
+        """Construct a range coder with the full range.
+
+        Range is kept at least TOP, so totals up to maximum_total leave at least
+        TOP // maximum_total values of the range for every unit of frequency.
+        """
+        self.range = self.STATE_MASK
+        self.maximum_total = 1 << 17
+
+    def _check_total(self, total):
+        """Raise an exception if the total of the frequency table is too large."""
+        if total > self.maximum_total:
+            raise ValueError("Cannot code symbol because total is too large")
+
+
+class RangeEncoder(RangeCoder):
+    """Class handling range encoding."""
+
+    def __init__(self, bitout):
+        """Construct a range encoder writing to the byte-aligned bit output stream."""
+        super(RangeEncoder, self).__init__()
+        self.output = bitout
+        self.low = 0
+        self.cache = 0
+        self.cache_size = 1
+
+    def write(self, freqs, symbol):
+        """Encode the given symbol based on the given frequency table."""
+        total = freqs.get_total()
+        symlow = freqs.get_low(symbol)
+        symhigh = freqs.get_high(symbol)
+        if symlow == symhigh:
+            raise ValueError("Symbol has zero frequency")
+        self._check_total(total)
+
+        r = self.range // total
+        self.low += r * symlow
+        self.range = r * (symhigh - symlow)
+        while self.range < self.TOP:
+            self.range <<= 8
+            self.shift_low()
+
+    def write_bit(self, probs, index, bit):
+        """Encode the bit with probability of 0 equal to probs[index] / PROB_ONE.
+
+        The probability is moved towards the coded bit by 1/2**MOVE_BITS
+        of the distance.
+        """
+        prob = probs[index]
+        bound = (self.range >> self.PROB_BITS) * prob
+        if bit:
+            self.low += bound
+            self.range -= bound
+            probs[index] = prob - (prob >> self.MOVE_BITS)
+        else:
+            self.range = bound
+            probs[index] = prob + ((self.PROB_ONE - prob) >> self.MOVE_BITS)
+        while self.range < self.TOP:
+            self.range <<= 8
+            self.shift_low()
+
+    def write_tree(self, probs, base, symbol, bits=8):
+        """Encode the symbol of bits bits as binary decisions along a bit-tree.
+
+        The decision of a bit has the probability probs[base + node], where
+        node is formed by the leading 1 and the preceding bits of the symbol.
+        The same as write_bit for every bit, but the state is kept in local
+        variables.
+        """
+        rng = self.range
+        prob_bits, prob_one, move_bits, top = self.PROB_BITS, self.PROB_ONE, self.MOVE_BITS, self.TOP
+        node = 1
+        for shift in range(bits - 1, -1, -1):
+            bit = (symbol >> shift) & 1
+            prob = probs[base + node]
+            bound = (rng >> prob_bits) * prob
+            if bit:
+                self.low += bound
+                rng -= bound
+                probs[base + node] = prob - (prob >> move_bits)
+            else:
+                rng = bound
+                probs[base + node] = prob + ((prob_one - prob) >> move_bits)
+            while rng < top:
+                rng <<= 8
+                self.shift_low()
+            node = (node << 1) | bit
+        self.range = rng
+
+    def shift_low(self):
+        """Move the top byte of low to the output.
+
+        The byte is held back in cache (with the following 0xFF bytes counted
+        by cache_size) until it is known whether a carry reaches it.
+        """
+        low = self.low
+        if low < 0xFF000000 or low > self.STATE_MASK:
+            carry = low >> 32
+            byte = self.cache
+            while True:
+                self.output.write_byte((byte + carry) & 0xFF)
+                byte = 0xFF
+                self.cache_size -= 1
+                if self.cache_size == 0:
+                    break
+            self.cache = (low >> 24) & 0xFF
+        self.cache_size += 1
+        self.low = (low & 0x00FFFFFF) << 8
+
+    def finish(self):
+        """Terminate the range coding by flushing all the bytes of low."""
+        for _ in range(5):
+            self.shift_low()
+
+
+class RangeDecoder(RangeCoder):
+    """Reads from a range-coded byte stream and decodes symbols."""
+
+    def __init__(self, bitin):
+        """Construct a range decoder reading from the byte-aligned bit input stream."""
+        super(RangeDecoder, self).__init__()
+        self.input = bitin
+        self.code = 0
+        for _ in range(5):
+            self.code = ((self.code << 8) | self.read_code_byte()) & self.STATE_MASK
+
+    def read(self, freqs):
+        """Decode the next symbol based on the given frequency table and return it."""
+        total = freqs.get_total()
+        self._check_total(total)
+        r = self.range // total
+        value = min(self.code // r, total - 1)
+        symbol = freqs.find_symbol(value)
+        symlow = freqs.get_low(symbol)
+        symhigh = freqs.get_high(symbol)
+
+        self.code -= r * symlow
+        self.range = r * (symhigh - symlow)
+        while self.range < self.TOP:
+            self.code = ((self.code << 8) | self.read_code_byte()) & self.STATE_MASK
+            self.range <<= 8
+        return symbol
+
+    def read_bit(self, probs, index):
+        """Decode the bit with probability of 0 equal to probs[index] / PROB_ONE.
+
+        The probability is updated in the same way as by the encoder.
+        """
+        prob = probs[index]
+        bound = (self.range >> self.PROB_BITS) * prob
+        if self.code < bound:
+            self.range = bound
+            probs[index] = prob + ((self.PROB_ONE - prob) >> self.MOVE_BITS)
+            bit = 0
+        else:
+            self.code -= bound
+            self.range -= bound
+            probs[index] = prob - (prob >> self.MOVE_BITS)
+            bit = 1
+        while self.range < self.TOP:
+            self.code = ((self.code << 8) | self.read_code_byte()) & self.STATE_MASK
+            self.range <<= 8
+        return bit
+
+    def read_tree(self, probs, base, bits=8):
+        """Decode the symbol of bits bits coded along a bit-tree by write_tree."""
+        rng = self.range
+        code = self.code
+        prob_bits, prob_one, move_bits, top = self.PROB_BITS, self.PROB_ONE, self.MOVE_BITS, self.TOP
+        node = 1
+        end = 1 << bits
+        while node < end:
+            prob = probs[base + node]
+            bound = (rng >> prob_bits) * prob
+            if code < bound:
+                rng = bound
+                probs[base + node] = prob + ((prob_one - prob) >> move_bits)
+                node <<= 1
+            else:
+                code -= bound
+                rng -= bound
+                probs[base + node] = prob - (prob >> move_bits)
+                node = (node << 1) | 1
+            while rng < top:
+                code = ((code << 8) | self.read_code_byte()) & self.STATE_MASK
+                rng <<= 8
+        self.range = rng
+        self.code = code
+        return node - end
+
+    def read_code_byte(self):
+        """Return the next byte from the input stream.
+
+        The end of stream is treated as an infinite number of trailing zeros.
+        """
+        byte = self.input.read_byte()
+        if byte == -1:
+            byte = 0
+        return byte
@@ -0,0 +1,47 @@
+"""Module opening input and output streams of the compressor and decompressor.
+
+Path '-' stands for the standard input or output, so the programs can be
+used as filters in a pipeline.
+"""
+import shutil
+import sys
+import tempfile
+
+
+STDIO = '-'
+CHUNK_SIZE = 1 << 16
+SPOOL_SIZE = 1 << 24
+
+
+def open_input(path):
+    """Open binary input file, or the standard input if path is '-'.
+
+    The standard input is not closed together with the returned stream.
+    """
+    if path == STDIO:
+        return open(sys.stdin.fileno(), 'rb', closefd=False)
+    return open(path, 'rb')
+
+
+def open_output(path):
+    """Open binary output file, or the standard output if path is '-'.
+
+    The standard output is not closed together with the returned stream.
+    """
+    if path == STDIO:
+        return open(sys.stdout.fileno(), 'wb', closefd=False)
+    return open(path, 'wb')
+
+
+def make_seekable(input):
+    """Return seekable stream with the contents of the input.
+
+    Input which cannot seek (e.g. a pipe) is copied to a temporary file,
+    kept in memory up to SPOOL_SIZE bytes.
+    """
+    if input.seekable():
+        return input
+    spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    shutil.copyfileobj(input, spool, CHUNK_SIZE)
+    spool.seek(0)
+    return spool
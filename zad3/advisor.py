@@ -0,0 +1,135 @@
+"""Choice of the coding of LZW output.
+
+LZW runs once with a recorder in place of the encoding. The recorder spools
+the codes, with the width of the binary code at each of them, to temporary
+files and keeps histograms of their lengths: the length of a gamma, delta
+or omega codeword depends only on the number of bits of the number, and of
+a Fibonacci one on the largest Fibonacci number not above it. Exact sizes
+of the output under every coding are computed from the histograms, and the
+spooled codes are written with the cheapest coding in slices of SLICE_SIZE
+codes, so the memory used does not grow with the input.
+"""
+import array
+import tempfile
+
+import numpy as np
+
+import batch_encoding
+
+
+SLICE_SIZE = 1 << 16
+MAX_BITS = 32
+
+
+class CodeRecorder():
+    """Encoding which records the codes instead of writing them.
+
+    It acts as its own output, whose size is the size of the codes written
+    with the binary coding. The ratio policy of LZW measures the compression
+    with it, so the codes do not depend on the coding chosen later.
+    """
+
+    universal = False
+
+    def __init__(self):
+        """Initialize with empty spools and histograms and the width of one bit."""
+        self.output = self
+        self.codes = array.array('I')
+        self.widths = array.array('B')
+        self.code_spool = tempfile.TemporaryFile()
+        self.width_spool = tempfile.TemporaryFile()
+        self.bit_lengths = np.zeros(MAX_BITS + 1, dtype=np.int64)
+        self.fibonacci_lengths = np.zeros(len(batch_encoding.FIBONACCI_TABLE) + 2, dtype=np.int64)
+        self.width = 1
+        self.bits = 0
+
+    def write(self, num):
+        """Record a number with the current width of the binary code."""
+        self.codes.append(num)
+        self.widths.append(self.width)
+        self.bits += self.width
+        if len(self.codes) >= SLICE_SIZE:
+            self.flush()
+
+    def write_many(self, nums):
+        """Record numbers."""
+        for num in nums:
+            self.write(num)
+
+    def set_maximum(self, num):
+        """Set width of the following numbers to the width of num."""
+        self.width = num.bit_length()
+
+    def get_totalbytes(self):
+        """Return number of bytes of the codes written with the binary coding."""
+        return self.bits >> 3
+
+    def flush(self):
+        """Count lengths of the recorded codes and move them to the spools."""
+        codes = np.frombuffer(self.codes, dtype=np.uint32)
+        self.bit_lengths += np.bincount(batch_encoding.bit_lengths(codes),
+                                        minlength=len(self.bit_lengths))
+        self.fibonacci_lengths += np.bincount(batch_encoding.fibonacci_lengths(codes),
+                                              minlength=len(self.fibonacci_lengths))
+        self.code_spool.write(self.codes.tobytes())
+        self.width_spool.write(self.widths.tobytes())
+        self.codes = array.array('I')
+        self.widths = array.array('B')
+
+    def slices(self):
+        """Yield arrays of (codes, widths) of at most SLICE_SIZE recorded codes."""
+        self.flush()
+        self.code_spool.seek(0)
+        self.width_spool.seek(0)
+        while True:
+            codes = np.frombuffer(self.code_spool.read(4 * SLICE_SIZE), dtype=np.uint32)
+            if not len(codes):
+                return
+            yield codes, np.frombuffer(self.width_spool.read(len(codes)), dtype=np.uint8)
+
+    def close(self):
+        """Remove the spools."""
+        self.code_spool.close()
+        self.width_spool.close()
+
+
+def coding_sizes(recorder):
+    """Return dictionary of sizes in bits of the recorded codes under every coding."""
+    recorder.flush()
+    powers = np.uint64(1) << np.arange(MAX_BITS, dtype=np.uint64)
+    sizes = {}
+    for code in ['gamma', 'delta', 'omega']:
+        # lengths of the codewords of numbers of 1, 2, ..., MAX_BITS bits
+        lengths = batch_encoding.CODEWORDS[code](powers)[1].astype(np.int64)
+        sizes[code] = int(recorder.bit_lengths[1:] @ lengths)
+    sizes['fib'] = int(recorder.fibonacci_lengths @ np.arange(len(recorder.fibonacci_lengths)))
+    sizes['binary'] = recorder.bits
+    return sizes
+
+
+def cheapest(sizes):
+    """Return name of the coding with the smallest size (the first one of equal)."""
+    return min(sizes, key=sizes.get)
+
+
+def write_codes(recorder, coding, bit_out):
+    """Write the recorded codes with the coding to the output bit stream.
+
+    Every slice of the codes is encoded at once with batch_encoding, with
+    the bits of the last, partial byte carried over to the next slice.
+    -- coding - name of the coding, one of the keys of coding_sizes
+    """
+    carry = 0
+    carry_bits = 0
+    for codes, widths in recorder.slices():
+        if coding == 'binary':
+            values, lengths = codes, widths
+        else:
+            values, lengths = batch_encoding.CODEWORDS[coding](codes)
+        total = carry_bits + int(lengths.sum(dtype=np.uint64))
+        data = batch_encoding.pack(np.append(np.uint64(carry), values),
+                                   np.append(np.uint64(carry_bits), lengths))
+        bit_out.write_bytes(data[:total >> 3])
+        carry_bits = total & 7
+        carry = data[-1] >> (8 - carry_bits) if carry_bits else 0
+    bit_out.write_bits(carry, carry_bits)
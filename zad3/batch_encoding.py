@@ -0,0 +1,139 @@
+"""Vectorized encoding of arrays of numbers with universal codes.
+
+Codewords of all the numbers are computed at once with NumPy as arrays of
+values and lengths in bits, the same as Encoding.codeword gives, and packed
+into a single buffer of bytes.
+"""
+import numpy as np
+
+import fibonacci
+
+
+MAX_NUMBER = (1 << 32) - 1
+
+
+def bit_lengths(nums):
+    """Return array of the numbers of bits of the numbers (as int.bit_length).
+
+    It is the binary exponent of the number, exact in float64 for numbers
+    up to MAX_NUMBER.
+    """
+    return np.frexp(np.asarray(nums, dtype=np.float64))[1].astype(np.uint64)
+
+
+def gamma_codewords(nums):
+    """Return (values, lengths) of Elias gamma codewords of the numbers."""
+    nums = _check(nums)
+    return nums, 2*bit_lengths(nums) - np.uint64(1)
+
+
+def delta_codewords(nums):
+    """Return (values, lengths) of Elias delta codewords of the numbers."""
+    nums = _check(nums)
+    lengths = bit_lengths(nums)
+    prefixes, prefix_lengths = gamma_codewords(lengths)
+    rest_lengths = lengths - np.uint64(1)
+    values = (prefixes << rest_lengths) | (nums ^ (np.uint64(1) << rest_lengths))
+    return values, prefix_lengths + rest_lengths
+
+
+def omega_codewords(nums):
+    """Return (values, lengths) of Elias omega codewords of the numbers."""
+    k = _check(nums).copy()
+    values = np.zeros(len(k), dtype=np.uint64)
+    lengths = np.ones(len(k), dtype=np.uint64)
+    active = k > 1
+    while active.any():
+        k_lengths = bit_lengths(k)
+        values[active] |= k[active] << lengths[active]
+        lengths[active] += k_lengths[active]
+        k[active] = k_lengths[active] - np.uint64(1)
+        active = k > 1
+    return values, lengths
+
+
+def _fibonacci_table():
+    """Return array of Fibonacci numbers fib(1), fib(2), ... up to the first above MAX_NUMBER."""
+    series = fibonacci.Fibonacci()
+    table = [series.fib(1)]
+    while table[-1] <= MAX_NUMBER:
+        table.append(series.fib(len(table) + 1))
+    return np.array(table, dtype=np.uint64)
+
+
+FIBONACCI_TABLE = _fibonacci_table()
+
+
+def fibonacci_lengths(nums):
+    """Return array of the lengths of Fibonacci codewords of the numbers."""
+    return np.searchsorted(FIBONACCI_TABLE, _check(nums), side='right').astype(np.uint64) \
+        + np.uint64(1)
+
+
+def fibonacci_codewords(nums):
+    """Return (values, lengths) of Fibonacci codewords of the numbers.
+
+    The bit of fib(i) is the i-th bit of the codeword, which ends with 1.
+    """
+    nums = _check(nums)
+    table = FIBONACCI_TABLE
+    lengths = fibonacci_lengths(nums)
+    values = np.ones(len(nums), dtype=np.uint64)
+    rest = nums.copy()
+    for i in range(int(lengths.max(initial=2)) - 2, -1, -1):
+        taken = rest >= table[i]
+        rest -= np.where(taken, table[i], np.uint64(0))
+        values |= taken.astype(np.uint64) << np.where(taken, lengths - np.uint64(1 + i), np.uint64(0))
+    return values, lengths
+
+
+CODEWORDS = {
+    'gamma': gamma_codewords,
+    'delta': delta_codewords,
+    'omega': omega_codewords,
+    'fib': fibonacci_codewords,
+}
+
+
+def pack(values, lengths):
+    """Return bytes of the codewords written one after another, most significant bit first.
+
+    Codewords (at most 64 bits long) are placed in 64-bit words at their
+    cumulative bit offsets. A codeword crossing the end of a word is split
+    between the two words. The last byte is padded with zeros, as
+    BitOutputStream does.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.asarray(lengths, dtype=np.uint64)
+    if len(lengths) == 0:
+        return b''
+    ends = np.cumsum(lengths)
+    total = int(ends[-1])
+    offsets = ends - lengths
+    words = np.zeros((total + 63) // 64 + 1, dtype=np.uint64)
+    indices = offsets >> np.uint64(6)
+    ends = (offsets & np.uint64(63)) + lengths
+    fits = ends <= 64
+    firsts = np.where(fits, values << np.where(fits, 64 - ends, 0).astype(np.uint64),
+                      values >> np.where(fits, 0, ends - 64).astype(np.uint64))
+    unique, starts = np.unique(indices, return_index=True)
+    words[unique] = np.bitwise_or.reduceat(firsts, starts)
+    crossing = ~fits
+    words[indices[crossing] + np.uint64(1)] |= values[crossing] << (128 - ends[crossing])
+    return words.astype('>u8').tobytes()[:(total + 7) // 8]
+
+
+def encode_array(nums, code):
+    """Encode array of numbers with the code and return the packed bytes.
+
+    -- code - name of the code, one of CODEWORDS
+    """
+    return pack(*CODEWORDS[code](nums))
+
+
+def _check(nums):
+    """Return the numbers as an array of uint64, checking they are in 1 - MAX_NUMBER."""
+    nums = np.asarray(nums)
+    if len(nums) and (nums.min() < 1 or nums.max() > MAX_NUMBER):
+        raise ValueError("Numbers must be in range 1 - " + str(MAX_NUMBER))
+    return nums.astype(np.uint64)
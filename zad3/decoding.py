@@ -1,8 +1,42 @@
-"""Wrapers to decoding input."""
+"""Wrapers to decoding input.
+
+Decoders peek PEEK_BITS bits of the input at once. Codewords not longer
+than that are looked up in a table built from the encoder of the code,
+longer ones are decoded from the count of leading zeros (or the groups of
+Elias omega, or the position of the terminating 11 in Fibonacci coding)
+in a peek of LONG_PEEK_BITS bits. Bit by bit decoding is used only near
+the end of the input, when there are less bits than peeked.
+"""
+import encoding
 import fibonacci
 from abc import ABC, abstractmethod
 
 
+PEEK_BITS = 16
+LONG_PEEK_BITS = 64
+FIBONACCI_BITS = 32
+
+
+def _codeword_table(code):
+    """Return lookup table of the codewords of the code not longer than PEEK_BITS bits.
+
+    Table is indexed by PEEK_BITS bits starting with a codeword and holds
+    (number, length of the codeword), or (0, 0) if the codeword is longer.
+    -- code - Encoding used to write the codewords, whose lengths must not
+              decrease with the number
+    """
+    table = [(0, 0)] * (1 << PEEK_BITS)
+    num = 1
+    codeword = code.encode(num)
+    while len(codeword) <= PEEK_BITS:
+        shift = PEEK_BITS - len(codeword)
+        start = int(codeword, 2) << shift
+        table[start:start + (1 << shift)] = [(num, len(codeword))] * (1 << shift)
+        num += 1
+        codeword = code.encode(num)
+    return table
+
+
 class Decoding(ABC):
     """Abstract class for encoding."""
 
@@ -10,6 +44,12 @@ class Decoding(ABC):
         """Initialize with output to write to."""
         self.input = inp  # BitInputStream
 
+    def set_maximum(self, num):
+        """Tell that no number larger than num will be read.
+
+        Universal codes do not need it.
+        """
+
     @abstractmethod
     def read(self):
         """Read from input and decode."""
@@ -19,8 +59,38 @@ class Decoding(ABC):
 class Gamma(Decoding):
     """Elias gamma decoding."""
 
+    table = None
+
+    def __init__(self, inp):
+        """Initialize with input to read from and the table of short codewords."""
+        super().__init__(inp)
+        if Gamma.table is None:
+            Gamma.table = _codeword_table(encoding.Gamma(None))
+
     def read(self):
         """Read from input and decode with Elias gamma coding."""
+        peek = self.input.peek_bits(PEEK_BITS)
+        if peek == -1:
+            return self.read_slow()
+        num, length = self.table[peek]
+        if length:
+            self.input.skip_bits(length)
+            return num
+        if peek:
+            zero_counter = PEEK_BITS - peek.bit_length()
+        else:
+            peek = self.input.peek_bits(LONG_PEEK_BITS)
+            if peek <= 0:
+                return self.read_slow()
+            zero_counter = LONG_PEEK_BITS - peek.bit_length()
+        self.input.skip_bits(zero_counter)
+        num = self.input.read_bits(zero_counter + 1)
+        if num == -1:
+            raise EOFError()
+        return num
+
+    def read_slow(self):
+        """Read from input bit by bit and decode with Elias gamma coding."""
         zero_counter = 0
         bit = self.input.read_bit()
         while bit == 0:
@@ -28,21 +98,38 @@ class Gamma(Decoding):
             bit = self.input.read_bit()
         if bit == -1:
             return -1
-        binary = str(bit)
-        for _ in range(zero_counter):
-            bit = self.input.read_bit()
-            if bit == -1:
-                raise EOFError()
-            binary += str(bit)
-
-        return int(binary, 2)
+        num = self.input.read_bits(zero_counter)
+        if num == -1:
+            raise EOFError()
+        return (1 << zero_counter) | num
 
 
 class Delta(Decoding):
     """Elias delta decoding."""
 
+    table = None
+
+    def __init__(self, inp):
+        """Initialize with input to read from and the table of short codewords."""
+        super().__init__(inp)
+        if Delta.table is None:
+            Delta.table = _codeword_table(encoding.Delta(None))
+
     def read(self):
         """Read from input and decode with Elias delta coding."""
+        peek = self.input.peek_bits(PEEK_BITS)
+        if peek <= 0:
+            return self.read_slow()
+        num, length = self.table[peek]
+        if length:
+            self.input.skip_bits(length)
+            return num
+        zero_counter = PEEK_BITS - peek.bit_length()
+        self.input.skip_bits(zero_counter)
+        return self._read_value(self.input.read_bits(zero_counter + 1))
+
+    def read_slow(self):
+        """Read from input bit by bit and decode with Elias delta coding."""
         zero_counter = 0
         bit = self.input.read_bit()
         while bit == 0:
@@ -50,24 +137,26 @@ class Delta(Decoding):
             bit = self.input.read_bit()
         if bit == -1:
             return -1
-        len_binary = str(bit)
-        for _ in range(zero_counter):
-            bit = self.input.read_bit()
-            if bit == -1:
-                raise EOFError()
-            len_binary += str(bit)
-        binary = '1'
-        for _ in range(int(len_binary, 2)-1):
-            bit = self.input.read_bit()
-            if bit == -1:
-                raise EOFError()
-            binary += str(bit)
-        return int(binary, 2)
+        len_binary = self.input.read_bits(zero_counter)
+        if len_binary == -1:
+            raise EOFError()
+        return self._read_value((1 << zero_counter) | len_binary)
+
+    def _read_value(self, length):
+        """Read the number of length bits without the leading 1."""
+        if length == -1:
+            raise EOFError()
+        num = self.input.read_bits(length - 1)
+        if num == -1:
+            raise EOFError()
+        return (1 << (length - 1)) | num
 
 
 class Omega(Decoding):
     """Elias omega decoding."""
 
+    table = None
+
     def __init__(self, inp):
         """Initialize new instance with output stream and special flag.
 
@@ -75,21 +164,52 @@ class Omega(Decoding):
         """
         super().__init__(inp)
         self.flag = False
+        if Omega.table is None:
+            Omega.table = _codeword_table(encoding.Omega(None))
 
     def read(self):
         """Read from input and decode with Elias omega coding."""
+        peek = self.input.peek_bits(PEEK_BITS)
+        if peek != -1:
+            num, length = self.table[peek]
+            if length:
+                self.input.skip_bits(length)
+                return num
+            peek = self.input.peek_bits(LONG_PEEK_BITS)
+            if peek != -1:
+                num = self._read_groups(peek)
+                if num:
+                    return num
+        return self.read_slow()
+
+    def _read_groups(self, peek):
+        """Decode the codeword at the start of LONG_PEEK_BITS peeked bits.
+
+        Every group starting with 1 is the length of the next one less 1,
+        and the codeword ends with 0. Return 0 if the codeword is longer
+        than the peeked bits, without streaming anything.
+        """
+        num = 1
+        used = 0
+        while (peek >> (LONG_PEEK_BITS - 1 - used)) & 1:
+            if used + num + 1 >= LONG_PEEK_BITS:
+                return 0
+            used += num + 1
+            num = (peek >> (LONG_PEEK_BITS - used)) & ((1 << (num + 1)) - 1)
+        self.input.skip_bits(used + 1)
+        return num
+
+    def read_slow(self):
+        """Read from input group by group and decode with Elias omega coding."""
         num = 1
         bit = self.input.read_bit()
         if bit == -1:
             return -1
         while bit != 0:
-            binary = str(bit)
-            for _ in range(num):
-                bit = self.input.read_bit()
-                if bit == -1:
-                    return -1
-                binary += str(bit)
-            num = int(binary, 2)
+            rest = self.input.read_bits(num)
+            if rest == -1:
+                return -1
+            num = (1 << num) | rest
             bit = self.input.read_bit()
             if bit == -1:
                 return -1
@@ -101,27 +221,84 @@ class Omega(Decoding):
 class Fibonacci(Decoding, fibonacci.Fibonacci):
     """Fibonacci decoding."""
 
+    table = None
+    byte_tables = None
+
     def __init__(self, inp):
-        """Initialize with Fibonacci cache and input to read from."""
+        """Initialize with Fibonacci cache, input to read from and lookup tables.
+
+        Besides the table of short codewords, there are tables of the sum
+        of Fibonacci numbers given by a byte at every byte of FIBONACCI_BITS
+        bits of a codeword.
+        """
         fibonacci.Fibonacci.__init__(self)
         Decoding.__init__(self, inp)
+        if Fibonacci.table is None:
+            Fibonacci.table = _codeword_table(encoding.Fibonacci(None))
+            Fibonacci.byte_tables = [
+                [sum(self.fib(8*k + i + 1) for i in range(8) if (byte >> (7 - i)) & 1)
+                 for byte in range(256)]
+                for k in range(FIBONACCI_BITS // 8)]
 
     def read(self):
         """Read from input and decode with Fibonacci coding."""
+        peek = self.input.peek_bits(PEEK_BITS)
+        if peek != -1:
+            num, length = self.table[peek]
+            if length:
+                self.input.skip_bits(length)
+                return num
+        peek = self.input.peek_bits(FIBONACCI_BITS)
+        if peek == -1:
+            return self.read_slow()
+        # the codeword ends with the first pair of 1s
+        pairs = peek & (peek >> 1)
+        if not pairs:
+            return self.read_slow()
+        length = FIBONACCI_BITS + 1 - pairs.bit_length()
+        self.input.skip_bits(length)
+        shift = FIBONACCI_BITS + 1 - length
+        peek = (peek >> shift) << shift
+        num = 0
+        for table in self.byte_tables:
+            num += table[(peek >> (FIBONACCI_BITS - 8)) & 0xFF]
+            peek <<= 8
+        return num
+
+    def read_slow(self):
+        """Read from input bit by bit and decode with Fibonacci coding."""
         old_bit = self.input.read_bit()
         new_bit = self.input.read_bit()
         if new_bit == -1:
             return -1
-        binary = str(old_bit)
+        num = self.fib(1) if old_bit else 0
+        i = 2
         while not old_bit == new_bit == 1:
             old_bit = new_bit
-            binary += str(old_bit)
+            if old_bit:
+                num += self.fib(i)
             new_bit = self.input.read_bit()
             if new_bit == -1:
                 return -1
-        num = 0
-        bin_len = len(binary)
-        for i in range(bin_len):
-            if binary[i] == '1':
-                num += self.fib(i+1)
+            i += 1
         return num
+
+
+class Binary(Decoding):
+    """Binary decoding with width growing with the maximum number."""
+
+    def __init__(self, inp):
+        """Initialize with input to read from and the width of one bit."""
+        super().__init__(inp)
+        self.width = 1
+
+    def set_maximum(self, num):
+        """Set width of the following numbers to the width of num."""
+        self.width = num.bit_length()
+
+    def read(self):
+        """Read a number written as an integer of the current width.
+
+        Return -1 at the end of the input.
+        """
+        return self.input.read_bits(self.width)
@@ -1,10 +1,24 @@
-"""Wrapers to encoding output."""
+"""Wrapers to encoding output.
+
+Codewords are computed as integers with their lengths in bits and written
+to the output with a single multi-bit write.
+"""
+import bisect
 import fibonacci
 from abc import ABC, abstractmethod
 
 
+BATCH_BITS = 1 << 12
+
+
 class Encoding(ABC):
-    """Abstract class for encoding."""
+    """Abstract class for encoding.
+
+    Universal codes do not depend on the largest number to be written, so
+    numbers can be collected and written in batches with write_many.
+    """
+
+    universal = True
 
     def __init__(self, out):
         """Initialize with output to write to."""
@@ -12,77 +26,135 @@ class Encoding(ABC):
 
     def write(self, num):
         """Encode a number and write to output."""
-        code = self.encode(num)
-        for bit in code:
-            self.output.write_bit(int(bit))
+        self.output.write_bits(*self.codeword(num))
+
+    def write_many(self, nums):
+        """Encode numbers and write them to output.
+
+        Codewords are joined into integers of about BATCH_BITS bits, so there
+        are few writes to the output.
+        """
+        codeword = self.codeword
+        value = 0
+        length = 0
+        for num in nums:
+            code, code_length = codeword(num)
+            value = (value << code_length) | code
+            length += code_length
+            if length >= BATCH_BITS:
+                self.output.write_bits(value, length)
+                value = 0
+                length = 0
+        self.output.write_bits(value, length)
+
+    def set_maximum(self, num):
+        """Tell that no number larger than num will be written.
+
+        Universal codes do not need it.
+        """
 
-    @abstractmethod
     def encode(self, num):
-        """Abstract method encoding a number."""
+        """Encode a number and return the codeword as a string of 0s and 1s."""
+        code, length = self.codeword(num)
+        return format(code, '0{}b'.format(length))
+
+    @abstractmethod
+    def codeword(self, num):
+        """Abstract method encoding a number as (codeword, length in bits)."""
         return NotImplementedError()
 
 
-def _gamma_encode(num):
-    """Encode a number with Elias gamma coding."""
-    binary = bin(num)
-    prefix_len = len(binary) - 3
-    return prefix_len*'0' + binary[2:]
+def _gamma_codeword(num):
+    """Encode a number with Elias gamma coding, return (codeword, length)."""
+    return num, 2*num.bit_length() - 1
 
 
 class Gamma(Encoding):
     """Elias gamma encoding."""
 
-    def encode(self, num):
+    def codeword(self, num):
         """Encode a number with Elias gamma coding."""
-        return _gamma_encode(num)
+        return _gamma_codeword(num)
 
 
 class Delta(Encoding):
     """Elias delta encoding."""
 
-    def encode(self, num):
+    def codeword(self, num):
         """Encode a number with Elias delta coding."""
-        binary = bin(num)
-        bin_len = len(binary) - 2
-        prefix = _gamma_encode(bin_len)
-        return prefix + binary[3:]
+        bin_len = num.bit_length()
+        prefix, prefix_len = _gamma_codeword(bin_len)
+        rest_len = bin_len - 1
+        return (prefix << rest_len) | (num ^ (1 << rest_len)), prefix_len + rest_len
 
 
 class Omega(Encoding):
     """Elias omega encoding."""
 
-    def encode(self, num):
+    def codeword(self, num):
         """Encode a number with Elias omega coding."""
-        if num == 0:
-            print(num)
-        result = '0'
+        if num < 1:
+            raise ValueError("Number must be positive")
+        code = 0
+        length = 1
         k = num
         while k > 1:
-            binary_k = bin(k)
-            result = binary_k[2:] + result
-            k = len(binary_k) - 3
-        return result
+            k_len = k.bit_length()
+            code |= k << length
+            length += k_len
+            k = k_len - 1
+        return code, length
 
 
 class Fibonacci(Encoding, fibonacci.Fibonacci):
     """Fibonacci encoding."""
 
     def __init__(self, out):
-        """Initialize with Fibonacci cache and output to write to."""
+        """Initialize with Fibonacci cache and output to write to.
+
+        The table of Fibonacci numbers (fib(1), fib(2), ...) grows as
+        larger numbers are encoded.
+        """
         fibonacci.Fibonacci.__init__(self)
         Encoding.__init__(self, out)
-
-    def encode(self, num):
-        """Encode a number with Fibonacci coding."""
-        i = 1
-        while self.fib(i+1) <= num:
-            i += 1
-        binary = ''
-        while i > 0:
-            if self.fib(i) <= num:
-                binary = '1' + binary
-                num -= self.fib(i)
-            else:
-                binary = '0' + binary
+        self.table = [self.fib(1)]
+
+    def codeword(self, num):
+        """Encode a number with Fibonacci coding.
+
+        The bit of fib(i) is the i-th bit of the codeword, which ends with 1.
+        """
+        while self.table[-1] <= num:
+            self.table.append(self.fib(len(self.table) + 1))
+        i = bisect.bisect_right(self.table, num) - 1
+        length = i + 2
+        code = 1
+        while i >= 0:
+            if self.table[i] <= num:
+                code |= 1 << (length - 1 - i)
+                num -= self.table[i]
             i -= 1
-        return binary + '1'
+        return code, length
+
+
+class Binary(Encoding):
+    """Binary encoding with width growing with the maximum number.
+
+    Numbers are written as integers of the width of the maximum, which the
+    user of the coding must keep up to date with set_maximum.
+    """
+
+    universal = False
+
+    def __init__(self, out):
+        """Initialize with output to write to and the width of one bit."""
+        super().__init__(out)
+        self.width = 1
+
+    def set_maximum(self, num):
+        """Set width of the following numbers to the width of num."""
+        self.width = num.bit_length()
+
+    def codeword(self, num):
+        """Encode a number with binary coding of the current width."""
+        return num, self.width
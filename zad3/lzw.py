@@ -1,42 +1,168 @@
 """LZW algorithm."""
+import array
+import collections
+import functools
 import math
 
 
 EOF_CODE = 257
+CLEAR_CODE = 258
+CHUNK_SIZE = 1 << 16
+POLICIES = ['freeze', 'reset', 'ratio']
+CODINGS = ['gamma', 'delta', 'omega', 'fib', 'binary']
+MAGIC = b'LZW3'
+
+
+def write_header(bit_output, coding, max_size=None):
+    """Write header of the compressed file.
+
+    It is MAGIC, a byte with the index of the coding in CODINGS and 32 bits
+    of the maximum size of the dictionary (0 for unbounded).
+    """
+    bit_output.write_bits(int.from_bytes(MAGIC, 'big'), 8 * len(MAGIC))
+    bit_output.write_bits(CODINGS.index(coding), 8)
+    bit_output.write_bits(max_size or 0, 32)
+
+
+def read_header(bit_input):
+    """Read header of the compressed file and return (coding, max_size).
+
+    Files of the first version of the compressor have no header. Without
+    MAGIC nothing is read and None is returned.
+    """
+    if bit_input.peek_bits(8 * len(MAGIC)) != int.from_bytes(MAGIC, 'big'):
+        return None
+    bit_input.skip_bits(8 * len(MAGIC))
+    index = bit_input.read_bits(8)
+    max_size = bit_input.read_bits(32)
+    if not 0 <= index < len(CODINGS) or max_size == -1 or 0 < max_size <= CLEAR_CODE:
+        raise ValueError("Corrupted header of the compressed file")
+    return CODINGS[index], max_size or None
+
+
+def initial_dictionary(max_size=None):
+    """Return beginning dictionary: the alphabet and EOF.
+
+    Bounded dictionary (max_size given) reserves also the code of CLEAR,
+    which tells the decoder to reset the dictionary.
+    """
+    dictionary = [bytes((x,)) for x in range(256)]
+    dictionary.append(None)  # EOF
+    if max_size is not None:
+        dictionary.append(None)  # CLEAR
+    return dictionary
 
 
 class LZWEncoder():
     """Class encoding files with LZW algorithm."""
 
-    def __init__(self, dictionary, input_file, output_encoder):
+    def __init__(self, dictionary, input_file, output_encoder, max_size=None, policy='freeze'):
         """Initialize new instance.
 
+        The dictionary is kept as a trie: a phrase is found by the code of its
+        prefix and its last byte in O(1), and a phrase gets the code equal to
+        its index in the list dictionary would have.
         -- dictionary - beginning dictionary with alphabet
         -- input_file - file to encode
         -- output_encoder - encoder to encode output
+        -- max_size - maximum number of phrases in the dictionary (None for unbounded)
+        -- policy - what to do with the full dictionary (one of POLICIES):
+                    freeze - keep using it without adding phrases
+                    reset - emit CLEAR and start again with the beginning dictionary
+                    ratio - freeze, but reset once the compression ratio of
+                            a chunk of input drops below the best one so far
         """
-        self.dict = dictionary
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy " + str(policy))
+        if max_size is not None and max_size <= len(dictionary):
+            raise ValueError("Maximum size must exceed the beginning dictionary")
+        self.roots = {}
+        self.children = {}
+        for code, phrase in enumerate(dictionary):
+            if phrase:
+                self._add(phrase, code)
+        self.initial_size = len(dictionary)
+        self.size = len(dictionary)
+        self.max_size = max_size
+        self.policy = policy
         self.input = input_file
         self.output_encoder = output_encoder
         self.totalbytes = 0
         self.sym_counter = [0 for _ in range(257)]
 
+    def _add(self, phrase, code):
+        """Add phrase, whose prefix is already in the dictionary, with the code."""
+        if len(phrase) == 1:
+            self.roots[phrase[0]] = code
+        else:
+            prefix = self.roots[phrase[0]]
+            for byte in phrase[1:-1]:
+                prefix = self.children[(prefix << 8) | byte]
+            self.children[(prefix << 8) | phrase[-1]] = code
+
     def encode(self):
-        """Perform LZW compression."""
-        prefix = b''
-        byte = self.input.read(1)
-        while byte:
-            self.totalbytes += 1
-            self.sym_counter[byte[0]] += 1
-            if prefix + byte in self.dict:
-                prefix += byte
-            else:
-                self.output_encoder.write(self.dict.index(prefix)+1)
-                self.dict.append(prefix+byte)
-                prefix = byte
-            byte = self.input.read(1)
-        self.output_encoder.write(self.dict.index(prefix)+1)
-        self.output_encoder.write(EOF_CODE)  # EOF
+        """Perform LZW compression.
+
+        Children of the trie are keyed by prefix_code << 8 | next_byte.
+        Codes of a universal coding are collected and written once per chunk
+        of input.
+        """
+        roots = self.roots
+        children = self.children
+        pending = []
+        write = pending.append if self.output_encoder.universal else self.output_encoder.write
+        set_maximum = self.output_encoder.set_maximum
+        set_maximum(self.size)
+        limit = self.max_size or math.inf
+        reset = self.policy == 'reset'
+        best_ratio = 0
+        prefix = -1
+        for block in iter(functools.partial(self.input.read, CHUNK_SIZE), b''):
+            self.totalbytes += len(block)
+            for byte, count in collections.Counter(block).items():
+                self.sym_counter[byte] += count
+            out_bytes = self.output_encoder.output.get_totalbytes()
+            for byte in block:
+                if prefix < 0:
+                    prefix = roots[byte]
+                    continue
+                key = (prefix << 8) | byte
+                code = children.get(key)
+                if code is None:
+                    write(prefix+1)
+                    if self.size < limit:
+                        children[key] = self.size
+                        self.size += 1
+                        set_maximum(self.size)
+                    elif reset:
+                        write(CLEAR_CODE)
+                        self._clear()
+                    prefix = roots[byte]
+                else:
+                    prefix = code
+            self.output_encoder.write_many(pending)
+            pending.clear()
+            if self.policy == 'ratio' and self.size >= limit:
+                ratio = len(block) / max(1, self.output_encoder.output.get_totalbytes() - out_bytes)
+                if ratio < best_ratio:
+                    if prefix >= 0:
+                        write(prefix+1)
+                    write(CLEAR_CODE)
+                    self._clear()
+                    best_ratio = 0
+                    prefix = -1
+                else:
+                    best_ratio = ratio
+        if prefix >= 0:
+            write(prefix+1)
+        write(EOF_CODE)  # EOF
+        self.output_encoder.write_many(pending)
+
+    def _clear(self):
+        """Reset the dictionary to the beginning one."""
+        self.children.clear()
+        self.size = self.initial_size
+        self.output_encoder.set_maximum(self.size)
 
     def get_totalbytes(self):
         """Return total number of read bytes (size of the input file)."""
@@ -44,43 +170,125 @@ class LZWEncoder():
 
     def get_input_entropy(self):
         """Calculate and return entropy of the input file."""
+        if self.totalbytes == 0:
+            return 0.0
         return sum([x*(math.log(self.totalbytes,2)-math.log(x,2)) for x in self.sym_counter if x > 0])/self.totalbytes
 
 
 class LZWDecoder():
     """Class decoding files with LZW algorithm."""
 
-    def __init__(self, dictionary, output_file, input_decoder):
+    def __init__(self, dictionary, output_file, input_decoder, max_size=None):
         """Initialize new instance.
 
+        The dictionary is kept in parallel arrays indexed by the phrase code:
+        code of the prefix (-1 for none), the last byte, the first byte, the
+        length of the phrase and the position in the output where the phrase
+        was written last (-1 for none), so a phrase takes a constant space.
         -- dictionary - beginning dictionary with alphabet
         -- output_file - decoded result file
         -- input_decoder - decoder to decode input
+        -- max_size - maximum number of phrases in the dictionary (None for unbounded),
+                      the same as in the encoder
         """
-        self.dict = dictionary
+        self.prefixes = array.array('i')
+        self.lasts = array.array('B')
+        self.firsts = array.array('B')
+        self.lengths = array.array('I')
+        self.positions = array.array('q')
+        codes = {}
+        for code, phrase in enumerate(dictionary):
+            if phrase:
+                codes[phrase] = code
+                self._append(codes[phrase[:-1]] if len(phrase) > 1 else -1, phrase[-1],
+                             phrase[0], len(phrase))
+            else:
+                self._append(-1, 0, 0, 0)
+        self.initial_size = len(dictionary)
         self.output = output_file
         self.input_decoder = input_decoder
+        self.max_size = max_size
+
+    def _append(self, prefix, last, first, length, position=-1):
+        """Append phrase to the arrays of the dictionary."""
+        self.prefixes.append(prefix)
+        self.lasts.append(last)
+        self.firsts.append(first)
+        self.lengths.append(length)
+        self.positions.append(position)
+
+    def _clear(self):
+        """Reset the dictionary to the beginning one."""
+        for entries in (self.prefixes, self.lasts, self.firsts, self.lengths, self.positions):
+            del entries[self.initial_size:]
+
+    def _build_phrase(self, buffer, code):
+        """Append the phrase to the buffer, following its prefixes from the end."""
+        prefixes = self.prefixes
+        lasts = self.lasts
+        start = len(buffer)
+        buffer += bytes(self.lengths[code])
+        for i in range(len(buffer) - 1, start - 1, -1):
+            buffer[i] = lasts[code]
+            code = prefixes[code]
 
     def decode(self):
-        """Perform LZW decompression."""
-        old_input = self.input_decoder.read()-1
-        if old_input < 0:
-            return
-        s = self.dict[old_input]
-        self.output.write(s)
+        """Perform LZW decompression.
+
+        Phrases are added to the dictionary as long as it is not full.
+        CLEAR (only in a bounded dictionary) resets it to the beginning one.
+        Before every code the input decoder is told the largest code the
+        encoder could write: the size of its dictionary, which is ahead by the
+        phrase added after the previous code.
+        Decoded phrases are collected in a buffer, which keeps the last
+        CHUNK_SIZE bytes of the output (starting at position base) after it is
+        written. A phrase written last within the buffer is copied from there,
+        otherwise it is built from its prefixes.
+        """
+        limit = self.max_size or math.inf
+        set_maximum = self.input_decoder.set_maximum
+        firsts = self.firsts
+        lengths = self.lengths
+        positions = self.positions
+        buffer = bytearray()
+        base = 0
+        old_position = -1
+        old_input = -1
+        set_maximum(len(lengths))
         new_input = self.input_decoder.read()
-        c = bytes((s[0],))
-        while new_input > 0:
+        while new_input > 0 and new_input != EOF_CODE:
+            if new_input == CLEAR_CODE and self.max_size is not None:
+                self._clear()
+                old_input = -1
+                set_maximum(len(lengths))
+                new_input = self.input_decoder.read()
+                continue
             new_input -= 1
-            if new_input < 0 or new_input >= len(self.dict):
-                s = self.dict[old_input]
-                s += c
+            if old_input >= 0 and len(lengths) < limit:
+                # the new phrase is the previous one and the first byte of the
+                # current one, which is the new phrase itself if not known yet
+                first = firsts[old_input if new_input >= len(lengths) else new_input]
+                self._append(old_input, first, firsts[old_input], lengths[old_input] + 1,
+                             old_position)
+            start = len(buffer)
+            position = positions[new_input] - base
+            length = lengths[new_input]
+            if length == 1:
+                buffer.append(firsts[new_input])
+            elif position >= 0:
+                buffer += buffer[position:position + length]
+                if len(buffer) - start < length:
+                    # the phrase is the previous one and its own first byte
+                    buffer.append(buffer[start])
             else:
-                s = self.dict[new_input]
-            self.output.write(s)
-            c = bytes((s[0],))
-            self.dict.append(self.dict[old_input]+c)
+                self._build_phrase(buffer, new_input)
+            old_position = positions[new_input] = base + start
+            if len(buffer) >= 2 * CHUNK_SIZE:
+                written = len(buffer) - CHUNK_SIZE
+                self.output.write(buffer[:written])
+                del buffer[:written]
+                base += written
             old_input = new_input
+            set_maximum(min(len(lengths) + 1, limit))
             new_input = self.input_decoder.read()
-            if new_input == EOF_CODE:
-                break
+        self.output.write(buffer)
@@ -2,9 +2,10 @@
 import argparse
 import contextlib
 
+import advisor
 import encoding
 from inout_bits import BitOutputStream
-from lzw import LZWEncoder
+from lzw import CLEAR_CODE, CODINGS, LZWEncoder, POLICIES, initial_dictionary, write_header
 
 
 def parse_arguments():
@@ -24,12 +25,34 @@ def parse_arguments():
 
     argparser.add_argument(
         '-c',
-        choices=['gamma', 'delta', 'omega', 'fib'],
-        default='omega',
-        help='Wybór kodowania skompresowanego pliku (default gamma)'
+        choices=CODINGS + ['auto'],
+        default='auto',
+        help='Wybór kodowania skompresowanego pliku (default auto). binary to kody '
+             'stałej szerokości, rosnącej wraz ze słownikiem. auto wybiera kodowanie '
+             'dające najmniejszy plik. Kodowanie jest zapisane w nagłówku pliku.'
     )
 
-    return argparser.parse_args()
+    argparser.add_argument(
+        '-m', '--max-size',
+        type=int,
+        help='Maksymalna liczba fraz słownika (bez limitu domyślnie). '
+             'Zapisana w nagłówku pliku.'
+    )
+
+    argparser.add_argument(
+        '-p', '--policy',
+        choices=POLICIES,
+        default='freeze',
+        help='Postępowanie z pełnym słownikiem: freeze - bez nowych fraz, reset - '
+             'od nowa, ratio - od nowa, gdy spada stopień kompresji (default freeze)'
+    )
+
+    args = argparser.parse_args()
+    if args.max_size is not None and args.max_size <= CLEAR_CODE:
+        argparser.error('max size must be greater than ' + str(CLEAR_CODE))
+    if args.max_size is not None and args.max_size >= 1 << 32:
+        argparser.error('max size must be less than 2**32')
+    return args
 
 
 def get_coding(arg):
@@ -40,19 +63,24 @@ def get_coding(arg):
         return encoding.Delta
     if arg == 'fib':
         return encoding.Fibonacci
+    if arg == 'binary':
+        return encoding.Binary
     return encoding.Omega
 
 
-def print_compression_data(input_filename, coding, encoder, bit_output):
+def print_compression_data(input_filename, coding, encoder, bit_output, sizes=None):
     """Print information about compression data.
     
     -- input_filename - input filename
     -- coding - name of the chosen coding
     -- encoder - LZW encoder used to encoding
     -- bit_output - output bit stream
+    -- sizes - sizes in bits of the codes under every coding (in auto mode)
     """
     print('Input file:', input_filename)
     print('Coding with:', coding)
+    for name, bits in (sizes or {}).items():
+        print('Codes size with {}: {} bytes'.format(name, (bits + 7) // 8))
     print('Input file size:', encoder.get_totalbytes(), 'bytes')
     print('Compressed file size:', bit_output.get_totalbytes(), 'bytes')
     print('Compression ratio:', encoder.get_totalbytes()/bit_output.get_totalbytes())
@@ -61,16 +89,30 @@ def print_compression_data(input_filename, coding, encoder, bit_output):
 
 
 def main():
-    """Perform compression of the input file."""
+    """Perform compression of the input file.
+
+    In auto mode LZW runs once with the codes recorded, and they are written
+    with the coding giving the smallest output.
+    """
     args = parse_arguments()
     with open(args.input_file, 'rb') as input_file, contextlib.closing(
                 BitOutputStream(open(args.output_file, "wb"))) as bit_out:
-        dictionary = [bytes((x,)) for x in range(256)]
-        dictionary.append(None)  # EOF
-        enc = LZWEncoder(dictionary, input_file, get_coding(args.c)(bit_out))
+        if args.c == 'auto':
+            with contextlib.closing(advisor.CodeRecorder()) as recorder:
+                enc = LZWEncoder(initial_dictionary(args.max_size), input_file, recorder,
+                                 args.max_size, args.policy)
+                enc.encode()
+                sizes = advisor.coding_sizes(recorder)
+                coding = advisor.cheapest(sizes)
+                write_header(bit_out, coding, args.max_size)
+                advisor.write_codes(recorder, coding, bit_out)
+            print_compression_data(args.input_file, coding, enc, bit_out, sizes)
+            return
+        write_header(bit_out, args.c, args.max_size)
+        enc = LZWEncoder(initial_dictionary(args.max_size), input_file,
+                         get_coding(args.c)(bit_out), args.max_size, args.policy)
         enc.encode()
         print_compression_data(args.input_file, args.c, enc, bit_out)
 
-
 if __name__ == '__main__':
     main()
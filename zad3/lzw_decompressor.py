@@ -4,7 +4,7 @@ import contextlib
 
 import decoding
 from inout_bits import BitInputStream
-from lzw import LZWDecoder
+from lzw import LZWDecoder, initial_dictionary, read_header
 
 
 def parse_arguments():
@@ -26,7 +26,8 @@ def parse_arguments():
         '-c',
         choices=['gamma', 'delta', 'omega', 'fib'],
         default='omega',
-        help='Wybór kodowania skompresowanego pliku (default gamma)'
+        help='Kodowanie pliku bez nagłówka, z pierwszej wersji kompresora (default omega). '
+             'Kodowanie pliku z nagłówkiem jest zapisane w nagłówku.'
     )
 
     return argparser.parse_args()
@@ -40,17 +41,24 @@ def get_coding(arg):
         return decoding.Delta
     if arg == 'fib':
         return decoding.Fibonacci
+    if arg == 'binary':
+        return decoding.Binary
     return decoding.Omega
 
 
 def main():
-    """Perform compression of the input file."""
+    """Perform decompression of the input file.
+
+    Coding and maximum size of the dictionary are read from the header.
+    A file without the header is decoded with the coding given by -c and
+    an unbounded dictionary.
+    """
     args = parse_arguments()
     with open(args.output_file, 'wb') as output_file, contextlib.closing(
                 BitInputStream(open(args.input_file, "rb"))) as input:
-        dictionary = [bytes((x,)) for x in range(256)]
-        dictionary.append(None)  # EOF
-        dec = LZWDecoder(dictionary, output_file, get_coding(args.c)(input))
+        coding, max_size = read_header(input) or (args.c, None)
+        dec = LZWDecoder(initial_dictionary(max_size), output_file, get_coding(coding)(input),
+                         max_size)
         dec.decode()
 
 